@@ -0,0 +1,162 @@
+"""
+Async front end to db_layer for the async FastAPI handlers.
+
+Cache lookups and key building are shared with db_layer. On a miss, the
+same query code runs through AsyncSession.run_sync, so psycopg's async
+driver does the I/O on the event loop and no threadpool worker is held.
+"""
+
+from __future__ import annotations
+from contextlib import asynccontextmanager
+from typing import Optional
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import db_layer as db
+
+async_engine = create_async_engine(db.DATABASE_URL, **db.engine_options())
+_checkout_wait = db._WaitStats()
+
+
+@asynccontextmanager
+async def _session():
+    """db_layer._session for the async engine."""
+    t0 = time.perf_counter()
+    async with AsyncSession(async_engine) as s:
+        try:
+            await s.connection()
+        except exc.TimeoutError:
+            _checkout_wait.timeout()
+            raise
+        _checkout_wait.observe(time.perf_counter() - t0)
+        yield s
+
+
+def pool_stats() -> dict:
+    pool = async_engine.pool
+    out = {"checkout_wait": _checkout_wait.stats()}
+    for name in ("size", "checkedout", "overflow", "checkedin"):
+        fn = getattr(pool, name, None)
+        if fn is not None:
+            out[name] = fn()
+    return out
+
+
+async def dispose() -> None:
+    await async_engine.dispose()
+
+
+async def _generation() -> int:
+    """db_layer._generation, read over the async engine."""
+    gen = db._generation_if_fresh()
+    if gen is not None:
+        return gen
+    try:
+        async with async_engine.connect() as conn:
+            gen = int((await conn.execute(db._GENERATION_SQL)).scalar() or 0)
+    except Exception:
+        gen = db._gen_value or 0
+    return db._store_generation(gen)
+
+
+async def search_page(
+    q: str,
+    page: int = 1,
+    per_page: int = 20,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    sort_by: str = "date",
+    sort_dir: str = "desc",
+    jurisdiction: str = "US",
+    mode: str = "substring",
+    cursor: Optional[str] = None,
+    count_mode: str = "exact",
+    facets=None,
+) -> db.SearchPage:
+    """Async db_layer.search_page; same arguments, cache and errors."""
+    year_from, year_to = db._year_bounds(year_from, year_to)
+    facets = db._parse_facets(facets)
+    gen = await _generation()
+    key = db._search_key(
+        gen, q, page, per_page, year_from, year_to, sort_by, sort_dir,
+        jurisdiction, mode, cursor, count_mode, facets,
+    )
+    res = db._search_cache.get(key)
+    if res is db._MISS:
+        async with _session() as s:
+            res = await s.run_sync(
+                db._search_page,
+                gen,
+                q=q,
+                page=page,
+                per_page=per_page,
+                year_from=year_from,
+                year_to=year_to,
+                sort_by=sort_by,
+                sort_dir=sort_dir,
+                jurisdiction=jurisdiction,
+                mode=mode,
+                cursor=cursor,
+                count_mode=count_mode,
+                facets=facets,
+            )
+        db._search_cache.put(key, res, size=db._approx_bytes(res.rows))
+    return res
+
+
+async def get_patent(number: str, jurisdiction: str = "US"):
+    """Async db_layer.get_patent."""
+    jurisdiction = (jurisdiction or "US").upper()
+    key = (await _generation(), jurisdiction, number)
+    r = db._patent_cache.get(key)
+    if r is db._MISS:
+        async with _session() as s:
+            r = await s.run_sync(db._get_patent, number, jurisdiction)
+        db._patent_cache.put(key, r, size=db._approx_bytes([r] if r else []) or db._CACHED_ROW_OVERHEAD)
+    return r
+
+
+async def get_patents(numbers, jurisdiction: str = "US"):
+    """Async db_layer.get_patents."""
+    ids = db._batch_ids(numbers)
+    if not ids:
+        return [], []
+    async with _session() as s:
+        return await s.run_sync(db._get_patents, ids, (jurisdiction or "US").upper())
+
+
+async def _iter_export(stmt, params: dict, fetch_rows: int):
+    async with _session() as s:
+        conn = await s.connection()
+        for sql in db._export_timeouts(conn.dialect.name):
+            await conn.exec_driver_sql(sql)
+        result = await s.stream(stmt.execution_options(yield_per=fetch_rows), params)
+        async for pid, title, title_en, d in result:
+            yield db.PatentRow(pid, title or "", title_en, d)
+
+
+async def open_export(stmt, params: dict, fetch_rows: int = 2000):
+    """Async db_layer.open_export: the rest is an async generator."""
+    rows = _iter_export(stmt, params, fetch_rows)
+    first = []
+    try:
+        async for r in rows:
+            first.append(r)
+            if len(first) >= fetch_rows:
+                break
+    except BaseException:
+        await rows.aclose()
+        raise
+    return first, rows
+
+
+async def get_stats(breakdown: Optional[str] = None) -> dict:
+    """Async db_layer.get_stats."""
+    gen = await _generation()
+    snap = db._stats_cache.get(gen)
+    if snap is db._MISS:
+        async with _session() as s:
+            snap = await s.run_sync(db._stats_snapshot, gen)
+    return db._stats_summary(snap, breakdown)
@@ -0,0 +1,17 @@
+-- Maintenance events are identified by (patent, event_code, event_date) so that
+-- re-ingesting the same or an overlapping MaintFeeEvents file is idempotent.
+
+-- Collapse duplicates left by earlier row-by-row loads
+DELETE FROM maint_events_raw
+WHERE ctid IN (
+  SELECT ctid FROM (
+    SELECT ctid, row_number() OVER (
+      PARTITION BY patent, event_code, event_date ORDER BY ctid
+    ) AS rn
+    FROM maint_events_raw
+  ) d
+  WHERE d.rn > 1
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS maint_events_raw_event_uniq
+  ON maint_events_raw (patent, event_code, event_date);
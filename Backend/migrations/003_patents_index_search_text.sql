@@ -0,0 +1,7 @@
+-- Normalized title + English title column for token search. Postgres keeps it
+-- current on every write, and one trigram index serves both languages.
+ALTER TABLE patents_index ADD COLUMN IF NOT EXISTS search_text TEXT
+  GENERATED ALWAYS AS (lower(coalesce(title, '') || ' ' || coalesce(title_en, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS patents_index_search_trgm
+  ON patents_index USING gin (search_text gin_trgm_ops);
@@ -0,0 +1,13 @@
+-- Full-text search vector for /search?mode=fts. English config for US titles
+-- and JP English titles, 'simple' for the Japanese titles themselves.
+ALTER TABLE patents_index ADD COLUMN IF NOT EXISTS search_tsv tsvector
+  GENERATED ALWAYS AS (
+    CASE WHEN jurisdiction = 'JP'
+      THEN to_tsvector('simple'::regconfig, coalesce(title, ''))
+           || to_tsvector('english'::regconfig, coalesce(title_en, ''))
+      ELSE to_tsvector('english'::regconfig, coalesce(title, '') || ' ' || coalesce(title_en, ''))
+    END
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS patents_index_search_tsv
+  ON patents_index USING gin (search_tsv);
@@ -0,0 +1,10 @@
+-- Keyset (cursor) pagination for /search: one index per sort_by/sort_dir.
+-- Keys match db_layer._sort_keys; the coalesces keep them NULL-free.
+CREATE INDEX IF NOT EXISTS patents_index_k_date_desc
+  ON patents_index (jurisdiction, (coalesce(date, '-infinity'::date)) DESC, (coalesce(lower(title), '')) ASC, patent_id);
+CREATE INDEX IF NOT EXISTS patents_index_k_date_asc
+  ON patents_index (jurisdiction, (coalesce(date, '-infinity'::date)) ASC, (coalesce(lower(title), '')) ASC, patent_id);
+CREATE INDEX IF NOT EXISTS patents_index_k_title_asc
+  ON patents_index (jurisdiction, (coalesce(lower(title), '')) ASC, (coalesce(date, '-infinity'::date)) DESC, patent_id);
+CREATE INDEX IF NOT EXISTS patents_index_k_title_desc
+  ON patents_index (jurisdiction, (coalesce(lower(title), '')) DESC, (coalesce(date, '-infinity'::date)) DESC, patent_id);
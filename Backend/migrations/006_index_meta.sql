@@ -0,0 +1,9 @@
+-- Generation counter for patents_index. The scrapper bumps it after every
+-- derive / JP ingest / index swap; the API drops its result cache when it changes.
+CREATE TABLE IF NOT EXISTS index_meta (
+  key   text PRIMARY KEY,
+  value bigint NOT NULL
+);
+
+INSERT INTO index_meta (key, value) VALUES ('generation', 0)
+ON CONFLICT (key) DO NOTHING;
@@ -0,0 +1,9 @@
+-- Summary counts behind /stats. Refreshed by the scrapper at the end of every
+-- derive / JP ingest / index swap (scrapper/index_meta.refresh_stats).
+CREATE TABLE IF NOT EXISTS patent_stats (
+  jurisdiction    text NOT NULL,
+  inactive_reason text,
+  year            int,
+  n               bigint NOT NULL,
+  refreshed_at    timestamptz NOT NULL DEFAULT now()
+);
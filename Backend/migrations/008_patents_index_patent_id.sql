@@ -0,0 +1,4 @@
+-- Lookups by patent number across jurisdictions (GET /patents?jurisdiction=ALL,
+-- POST /patents:batch). The primary key leads with jurisdiction, so it cannot serve them.
+CREATE INDEX IF NOT EXISTS patents_index_patent_id_idx
+  ON patents_index (patent_id);
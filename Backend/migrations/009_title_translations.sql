@@ -0,0 +1,22 @@
+-- Translation cache and queue for JP titles (scrapper/translate.py).
+-- JP ingest fills title_en from the cache and queues the rest; `jp-translate`
+-- drains the queue. ja_hash = md5(ja), so rows join to the cache on md5(title).
+CREATE TABLE IF NOT EXISTS title_translations (
+  ja_hash  text PRIMARY KEY,
+  ja       text NOT NULL,
+  en       text NOT NULL,
+  provider text NOT NULL,
+  ts       timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS title_translation_queue (
+  ja_hash   text PRIMARY KEY,
+  ja        text NOT NULL,
+  attempts  int NOT NULL DEFAULT 0,
+  queued_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- JP rows still waiting for an English title.
+CREATE INDEX IF NOT EXISTS patents_index_jp_untranslated_idx
+  ON patents_index (patent_id)
+  WHERE jurisdiction = 'JP' AND title_en IS NULL;
@@ -1,13 +1,22 @@
 from __future__ import annotations
 from datetime import date
-from typing import List, Optional
+import csv
+import io
+from typing import Annotated, Dict, List, Optional
 
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy import exc as sa_exc
+from pydantic import BaseModel, Field
 from settings import settings
+import orjson
 import db_layer as db
 
+if settings.async_db:
+    import db_async
+
 app = FastAPI(title="UWO Patent Website API", version="0.2.0")
 
 explicit = [o.strip() for o in settings.cors_origins if o and o.strip()]
@@ -28,12 +37,70 @@ class PatentHit(BaseModel):
     grant_date: Optional[date] = None
 
 
+class FacetCount(BaseModel):
+    value: Optional[str] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    count: int
+
+
 class SearchResponse(BaseModel):
     q: str
     page: int
     per_page: int
     total: int
     results: List[PatentHit]
+    next_cursor: Optional[str] = None
+    total_is_lower_bound: bool = False
+    total_is_estimate: bool = False
+    facets: Optional[Dict[str, List[FacetCount]]] = None
+    facets_truncated: bool = False
+
+
+@app.exception_handler(sa_exc.TimeoutError)
+@app.exception_handler(sa_exc.OperationalError)
+async def _db_overloaded(request: Request, e: Exception):
+    # Pool exhausted, statement_timeout hit or the database unreachable:
+    # tell the client to back off instead of returning a 500.
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database busy, retry shortly"},
+        headers={"Retry-After": str(settings.db_retry_after_seconds)},
+    )
+
+
+def _orjson(content) -> Response:
+    """
+    JSON response encoded by orjson, bypassing response_model validation.
+    Only for trusted DB output; PatentRow dataclasses and dates serialize natively.
+    """
+    return Response(orjson.dumps(content), media_type="application/json")
+
+
+async def _db(name: str, *args, **kwargs):
+    """Call db_layer.<name>, or its db_async twin when settings.async_db is on."""
+    if settings.async_db:
+        return await getattr(db_async, name)(*args, **kwargs)
+    return await run_in_threadpool(getattr(db, name), *args, **kwargs)
+
+
+class BatchRequest(BaseModel):
+    numbers: List[Annotated[str, Field(max_length=32)]] = Field(..., min_length=1, max_length=settings.batch_max_ids)
+    jurisdiction: str = Field("US", pattern="^(US|JP|ALL)$")
+
+
+class BatchResponse(BaseModel):
+    jurisdiction: str
+    found: List[PatentHit]
+    not_found: List[str]
+
+
+# Rows per orjson.dumps call while streaming a batch response
+BATCH_STREAM_CHUNK = 1000
+# Rows encoded per chunk of an /export response
+EXPORT_STREAM_CHUNK = 500
+EXPORT_FIELDS = ("patent", "title", "title_en", "grant_date")
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
 
 
 @app.on_event("startup")
@@ -42,55 +109,213 @@ def _startup():
     db.seed_if_empty()
 
 
+@app.on_event("shutdown")
+async def _shutdown():
+    if settings.async_db:
+        await db_async.dispose()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    out = db.cache_stats()
+    out["pool"] = db.pool_stats()
+    if settings.async_db:
+        out["async_pool"] = db_async.pool_stats()
+    return out
+
+
 @app.get("/stats")
-def stats():
-    _, total = db.search_patents(q="", page=1, per_page=1, jurisdiction="US")
-    return {"total_inactive_patents": total}
+async def stats(breakdown: Optional[str] = Query(None, pattern="^year$")):
+    return await _db("get_stats", breakdown=breakdown)
 
 
 @app.get("/search", response_model=SearchResponse)
-def search(
+async def search(
     q: str = Query(..., min_length=1, max_length=128),
     page: int = Query(1, ge=1, le=1000),
     per_page: int = Query(20, ge=1, le=100),
     year_from: Optional[int] = Query(None, ge=1900, le=2100),
     year_to: Optional[int] = Query(None, ge=1900, le=2100),
-    sort_by: str = Query("date", pattern="^(date|title)$"),
+    sort_by: str = Query("date", pattern="^(date|title|relevance)$"),
     sort_dir: str = Query("desc", pattern="^(asc|desc)$"),
     jurisdiction: str = Query("US", pattern="^(US|JP|ALL)$"),
+    mode: str = Query("substring", pattern="^(substring|fts)$"),
+    cursor: Optional[str] = Query(None, max_length=1024),
+    count_mode: str = Query("exact", pattern="^(exact|estimate|capped)$"),
+    facets: Optional[str] = Query(None, max_length=64, pattern="^[a-z,]+$"),
 ):
-    rows, total = db.search_patents(
-        q=q,
-        page=page,
-        per_page=per_page,
-        year_from=year_from,
-        year_to=year_to,
-        sort_by=sort_by,
-        sort_dir=sort_dir,
-        jurisdiction=jurisdiction,
-    )
-    return SearchResponse(
-        q=q,
-        page=page,
-        per_page=per_page,
-        total=total,
-        results=[
-            PatentHit(patent=r.patent, title=r.title, title_en=getattr(r, "title_en", None), grant_date=r.grant_date) for r in rows
-        ],
-    )
+    try:
+        res = await _db(
+            "search_page",
+            q=q,
+            page=page,
+            per_page=per_page,
+            year_from=year_from,
+            year_to=year_to,
+            sort_by=sort_by,
+            sort_dir=sort_dir,
+            jurisdiction=jurisdiction,
+            mode=mode,
+            cursor=cursor,
+            count_mode=count_mode,
+            facets=facets,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # response_model only documents the shape; see _orjson
+    return _orjson({
+        "q": q,
+        "page": page,
+        "per_page": per_page,
+        "total": res.total,
+        "results": res.rows,
+        "next_cursor": res.next_cursor,
+        "total_is_lower_bound": res.total_is_lower_bound,
+        "total_is_estimate": res.total_is_estimate,
+        "facets": res.facets,
+        "facets_truncated": res.facets_truncated,
+    })
 
 
 @app.get("/patents/{number}", response_model=PatentHit)
-def get_patent(
+async def get_patent(
     number: str,
     jurisdiction: str = Query("US", pattern="^(US|JP|ALL)$"),
 ):
-    r = db.get_patent(number, jurisdiction=jurisdiction)
+    r = await _db("get_patent", number, jurisdiction=jurisdiction)
     if not r:
         raise HTTPException(status_code=404, detail="Not found")
-    return PatentHit(patent=r.patent, title=r.title, title_en=getattr(r, "title_en", None), grant_date=r.grant_date)
\ No newline at end of file
+    return _orjson(r)
+
+
+def _stream_batch(jurisdiction: str, found: list, not_found: list):
+    yield b'{"jurisdiction":' + orjson.dumps(jurisdiction) + b',"found":['
+    for i in range(0, len(found), BATCH_STREAM_CHUNK):
+        if i:
+            yield b","
+        yield orjson.dumps(found[i:i + BATCH_STREAM_CHUNK])[1:-1]
+    yield b'],"not_found":' + orjson.dumps(not_found) + b"}"
+
+
+@app.post("/patents:batch", response_model=BatchResponse)
+async def get_patents_batch(req: BatchRequest):
+    """
+    Resolve up to settings.batch_max_ids patent numbers in one query.
+    Duplicates are dropped; both lists keep the request order.
+    """
+    found, not_found = await _db("get_patents", req.numbers, jurisdiction=req.jurisdiction)
+    return StreamingResponse(
+        _stream_batch(req.jurisdiction, found, not_found),
+        media_type="application/json",
+    )
+
+
+def _encode_export(rows: list, fmt: str) -> bytes:
+    if fmt == "ndjson":
+        return b"".join(orjson.dumps(r) + b"\n" for r in rows)
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerows(
+        (r.patent, r.title, r.title_en or "", r.grant_date.isoformat() if r.grant_date else "")
+        for r in rows
+    )
+    return buf.getvalue().encode("utf-8")
+
+
+def _export_header(fmt: str) -> bytes:
+    return (",".join(EXPORT_FIELDS) + "\r\n").encode("utf-8") if fmt == "csv" else b""
+
+
+def _export_error(fmt: str) -> bytes:
+    # Last line of an export cut short after the 200 went out, so a partial
+    # file cannot pass for a complete one.
+    if fmt == "ndjson":
+        return b'{"error":"export truncated: database error"}\n'
+    return b"#ERROR export truncated: database error\r\n"
+
+
+def _stream_export(first: list, rows, fmt: str):
+    yield _export_header(fmt)
+    for i in range(0, len(first), EXPORT_STREAM_CHUNK):
+        yield _encode_export(first[i:i + EXPORT_STREAM_CHUNK], fmt)
+    chunk = []
+    try:
+        for r in rows:
+            chunk.append(r)
+            if len(chunk) >= EXPORT_STREAM_CHUNK:
+                yield _encode_export(chunk, fmt)
+                chunk = []
+    except Exception:
+        yield _export_error(fmt)
+        return
+    if chunk:
+        yield _encode_export(chunk, fmt)
+
+
+async def _astream_export(first: list, rows, fmt: str):
+    yield _export_header(fmt)
+    for i in range(0, len(first), EXPORT_STREAM_CHUNK):
+        yield _encode_export(first[i:i + EXPORT_STREAM_CHUNK], fmt)
+    chunk = []
+    try:
+        async for r in rows:
+            chunk.append(r)
+            if len(chunk) >= EXPORT_STREAM_CHUNK:
+                yield _encode_export(chunk, fmt)
+                chunk = []
+    except Exception:
+        yield _export_error(fmt)
+        return
+    if chunk:
+        yield _encode_export(chunk, fmt)
+
+
+@app.get("/export")
+async def export(
+    q: str = Query(..., min_length=1, max_length=128),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    year_from: Optional[int] = Query(None, ge=1900, le=2100),
+    year_to: Optional[int] = Query(None, ge=1900, le=2100),
+    sort_by: str = Query("date", pattern="^(date|title|relevance)$"),
+    sort_dir: str = Query("desc", pattern="^(asc|desc)$"),
+    jurisdiction: str = Query("US", pattern="^(US|JP|ALL)$"),
+    mode: str = Query("substring", pattern="^(substring|fts)$"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.export_max_rows),
+):
+    """
+    Every hit of a /search query as CSV or NDJSON, streamed from a
+    server-side cursor. At most `limit` rows (default and ceiling:
+    settings.export_max_rows). A database error after streaming has begun
+    ends the body with an error line instead of a silent cut.
+    """
+    try:
+        stmt, params = db.export_query(
+            q=q,
+            year_from=year_from,
+            year_to=year_to,
+            sort_by=sort_by,
+            sort_dir=sort_dir,
+            jurisdiction=jurisdiction,
+            mode=mode,
+            max_rows=limit or settings.export_max_rows,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # The query runs and its first rows are fetched before the response
+    # starts, so a pool or statement timeout still becomes a 503.
+    first, rows = await _db("open_export", stmt, params, settings.export_fetch_rows)
+    if settings.async_db:
+        body = _astream_export(first, rows, format)
+    else:
+        body = _stream_export(first, rows, format)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="patents.{format}"'},
+    )
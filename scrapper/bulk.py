@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from typing import Iterable, Sequence
+
+
+def raw_connection(conn):
+    """Return the psycopg connection behind a SQLAlchemy Connection (same transaction)."""
+    return conn.connection.driver_connection
+
+
+def copy_rows(conn, table: str, columns: Sequence[str], rows: Iterable[Sequence]) -> int:
+    """
+    Stream rows into `table` with PostgreSQL COPY (psycopg3 cursor.copy).
+
+    Runs inside the caller's transaction, so the usual pattern is:
+    COPY into a TEMP staging table, then merge with one set-based statement.
+    Returns the number of rows written.
+    """
+    cols = ", ".join(columns)
+    n = 0
+    with raw_connection(conn).cursor() as cur:
+        with cur.copy(f"COPY {table} ({cols}) FROM STDIN") as cp:
+            for row in rows:
+                cp.write_row(row)
+                n += 1
+    return n
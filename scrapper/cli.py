@@ -1,9 +1,13 @@
 from argparse import ArgumentParser
+from collections import deque
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from sqlalchemy import create_engine
 from sqlalchemy import text as sql_text
 import os
 import re
+import time
 
 from dotenv import load_dotenv, find_dotenv
 
@@ -15,12 +19,20 @@ if not os.getenv("DATABASE_URL"):
     load_dotenv(ROOT / "backend" / ".env", override=True)
 
 from .paths import DOWNLOADS
-from .grants import load_grants
-from .maintenance import load_maintenance
+from .grants import (
+    load_grants, load_grant_rows, parse_grants_zip, LOADERS, COPY_BATCH_SIZE,
+    extractor_stats, merge_extractor_stats,
+)
+from .maintenance import load_maintenance_stats, MaintLoadStats
 from .derive import rebuild_inactive
+from .index_swap import rollback_index_swap
 
 # NEW: JP ingest
-from .jp_ingest import ingest_jpdrp_to_index
+from .jp_ingest import (
+    ingest_jpdrp_to_index, jpdrp_archives, applied_archives, parse_jpdrp_member,
+    load_jp_archive, finish_jp_ingest, MGT_MEMBERS,
+)
+from .translate import TRANSLATORS, TranslatorUnavailable, local_endpoint, translate_pending
 
 
 def get_engine():
@@ -47,10 +59,103 @@ def _is_maint_zip(p: Path) -> bool:
     return n.endswith(".zip") and ("maint" in n or "ptmnfee" in n or "maintenance" in n)
 
 
+def _print_rate(args, name: str, n: int, dt: float) -> None:
+    rate = n / dt if dt > 0 else 0.0
+    print(f"[grants:{args.loader}] {name}: {n:,} rows in {dt:.1f}s ({rate:,.0f} rows/sec)")
+
+
+def _print_extractor_stats() -> None:
+    """How often each document family hit the anchored XPaths vs the expensive fallbacks."""
+    stats = extractor_stats()
+    if stats:
+        print("[grants] extractor hits: " + ", ".join(f"{k}={v:,}" for k, v in sorted(stats.items())))
+
+
+def _maint_summary(m: MaintLoadStats) -> str:
+    return f"{m.inserted:,} (duplicates {m.duplicates:,}, rejected {m.rejected:,})"
+
+
+def _load_grants_timed(zip_path: Path, eng, args) -> int:
+    """load_grants with the selected --loader, reporting throughput so loaders can be compared."""
+    t0 = time.perf_counter()
+    n = load_grants(zip_path, eng, loader=args.loader, batch_size=args.batch_size)
+    _print_rate(args, zip_path.name, n, time.perf_counter() - t0)
+    return n
+
+
+def _iter_parsed_grants(zips, workers: int):
+    """
+    Parse grant ZIPs in a process pool and yield (zip, (rows, stats), error) in input order.
+
+    At most 2*workers ZIPs are in flight, so parsed rows never pile up faster
+    than the single writer can load them.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        todo = iter(zips)
+        pending = deque()
+        for z in todo:
+            pending.append((z, pool.submit(parse_grants_zip, z)))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            z, fut = pending.popleft()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(parse_grants_zip, nxt)))
+            try:
+                yield z, fut.result(), None
+            except Exception as e:
+                yield z, None, e
+
+
+def _iter_parsed_jpdrp(archives, workers: int, today):
+    """
+    Parse every MGT member of each archive in a process pool and yield
+    (archive, rows, error) in archive order; rows are the members' rows
+    concatenated in MGT_MEMBERS order.
+
+    At most 2*workers archives are in flight, as in _iter_parsed_grants.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def submit(a):
+            return a, [pool.submit(parse_jpdrp_member, str(a), m, today) for m in MGT_MEMBERS]
+
+        todo = iter(archives)
+        pending = deque()
+        for a in todo:
+            pending.append(submit(a))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            a, futs = pending.popleft()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append(submit(nxt))
+            try:
+                parts = [f.result() for f in futs]
+            except Exception as e:
+                yield a, None, e
+                continue
+            if all(p is None for p in parts):
+                yield a, None, RuntimeError("archive contains neither " + " nor ".join(MGT_MEMBERS))
+                continue
+            yield a, [row for p in parts if p for row in p], None
+
+
 def cmd_derive(args):
+    if args.swap and not args.full:
+        raise SystemExit("--swap requires --full")
+    eng = get_engine()
+    n = rebuild_inactive(eng, full=args.full, swap_index=args.swap)
+    print(f"inactive_patents {'rebuilt' if args.full else 'updated'}: {n:,} rows")
+    if args.swap:
+        print("patents_index rebuilt and swapped in (previous table kept as patents_index_old)")
+
+
+def cmd_index_rollback(args):
     eng = get_engine()
-    n = rebuild_inactive(eng)
-    print(f"inactive_patents rebuilt: {n:,} rows")
+    rollback_index_swap(eng)
+    print("patents_index rolled back to the previous table (the replaced one is now patents_index_old)")
 
 
 def cmd_verify(args):
@@ -80,10 +185,11 @@ def cmd_verify(args):
 
 def cmd_build(args):
     eng = get_engine()
-    g_count = load_grants(Path(args.grants_zip), eng)
-    m_count = load_maintenance(Path(args.maint_zip), eng)
-    i_count = rebuild_inactive(eng)
-    print(f"grants: {g_count:,}, maint: {m_count:,}, inactive now: {i_count:,}")
+    g_count = _load_grants_timed(Path(args.grants_zip), eng, args)
+    _print_extractor_stats()
+    m = load_maintenance_stats(Path(args.maint_zip), eng)
+    i_count = rebuild_inactive(eng, full=False)
+    print(f"grants: {g_count:,}, maint: {_maint_summary(m)}, inactive now: {i_count:,}")
 
 
 def cmd_latest(args):
@@ -101,10 +207,11 @@ def cmd_latest(args):
         raise SystemExit(f"No maintenance ZIP file found under {DOWNLOADS}")
     print(f"Using grant ZIP: {grants_zip.name}")
     print(f"Using maint ZIP: {maint_zip.name}")
-    g_count = load_grants(grants_zip, eng)
-    m_count = load_maintenance(maint_zip, eng)
-    i_count = rebuild_inactive(eng)
-    print(f"grants: {g_count:,}, maint: {m_count:,}, inactive now: {i_count:,}")
+    g_count = _load_grants_timed(grants_zip, eng, args)
+    _print_extractor_stats()
+    m = load_maintenance_stats(maint_zip, eng)
+    i_count = rebuild_inactive(eng, full=False)
+    print(f"grants: {g_count:,}, maint: {_maint_summary(m)}, inactive now: {i_count:,}")
 
 
 def cmd_ingest_dir(args):
@@ -112,26 +219,49 @@ def cmd_ingest_dir(args):
     eng = get_engine()
     root = Path(args.dir).resolve()
     zips = sorted(root.rglob("*.zip"))
-    g_total = m_total = 0
+    g_total = 0
+    m_total = MaintLoadStats()
+
+    if args.workers > 1:
+        # Parsing fans out to worker processes; this process is the only DB writer
+        # and loads ZIPs in sorted order, so counts and final rows are deterministic.
+        grant_zips = [z for z in zips if _is_grants_zip(z)]
+        for z, parsed, err in _iter_parsed_grants(grant_zips, args.workers):
+            if err is not None:
+                print(f"[skip] {z.name}: {err}")
+                continue
+            rows, stats = parsed
+            merge_extractor_stats(stats)
+            try:
+                t0 = time.perf_counter()
+                c = load_grant_rows(rows, eng, loader=args.loader, batch_size=args.batch_size)
+                _print_rate(args, z.name, c, time.perf_counter() - t0)
+            except Exception as e:
+                print(f"[skip] {z.name}: {e}")
+                continue
+            g_total += c
+            print(f"[grants] {z.name}: +{c:,} (total {g_total:,})")
+        zips = [z for z in zips if not _is_grants_zip(z)]
 
     for z in zips:
         n = z.name
         try:
             if _is_grants_zip(z):
-                c = load_grants(z, eng)
+                c = _load_grants_timed(z, eng, args)
                 g_total += c
                 print(f"[grants] {n}: +{c:,} (total {g_total:,})")
             elif _is_maint_zip(z):
-                c = load_maintenance(z, eng)
-                m_total += c
-                print(f"[maint]  {n}: +{c:,} (total {m_total:,})")
+                m = load_maintenance_stats(z, eng)
+                m_total.add(m)
+                print(f"[maint]  {n}: +{m.inserted:,} (total {m_total.inserted:,})")
             else:
                 continue
         except Exception as e:
             print(f"[skip] {n}: {e}")
 
-    i_count = rebuild_inactive(eng)
-    print(f"== DONE == grants: {g_total:,}, maint: {m_total:,}, inactive now: {i_count:,}")
+    _print_extractor_stats()
+    i_count = rebuild_inactive(eng, full=False)
+    print(f"== DONE == grants: {g_total:,}, maint: {_maint_summary(m_total)}, inactive now: {i_count:,}")
 
 
 # NEW: Japan ingest command (JPDRP tar.gz -> patents_index)
@@ -141,34 +271,145 @@ def cmd_jp_ingest(args):
         raise SystemExit(f"JPDRP tar not found: {jp_tar}")
     n = ingest_jpdrp_to_index(str(jp_tar))
     print(f"[JP] patents_index upserted: {n:,} rows")
+    print("[JP] untranslated titles are queued; run `jp-translate` to fill title_en")
+
+
+def cmd_jp_ingest_dir(args):
+    """
+    Ingest every JPDRP archive under a directory, oldest first so later
+    updates win. Workers parse and filter; this process is the only writer,
+    applies one archive per transaction and records it in jp_ingest_state,
+    so a rerun skips archives that were already applied.
+    """
+    eng = get_engine()
+    root = Path(args.dir).resolve()
+    archives = jpdrp_archives(root)
+    if not archives:
+        raise SystemExit(f"No JPDRP *.tar.gz files found under {root}")
+    done = applied_archives(eng)
+    todo = [a for a in archives if a.name not in done]
+    print(f"[JP] {len(archives):,} archives, {len(archives) - len(todo):,} already applied")
+
+    total = 0
+    failed = None
+    today = date.today()
+    for a, rows, err in _iter_parsed_jpdrp(todo, args.workers, today):
+        if err is not None:
+            # Later archives would be applied on top of a gap; stop here so a
+            # rerun picks up from this archive once it is fixed.
+            print(f"[JP] {a.name}: {err}")
+            print("[JP] stopping; rerun to continue from this archive")
+            failed = a
+            break
+        t0 = time.perf_counter()
+        n = load_jp_archive(rows, eng, a)
+        total += n
+        print(f"[JP] {a.name}: +{n:,} rows in {time.perf_counter() - t0:.1f}s (total {total:,})")
+
+    if total:
+        finish_jp_ingest(eng)
+    print(f"== DONE == JP rows upserted: {total:,}")
+    if total:
+        print("[JP] untranslated titles are queued; run `jp-translate` to fill title_en")
+    if failed is not None:
+        # Non-zero so a scheduled catch-up run does not look successful
+        raise SystemExit(1)
+
+
+def cmd_jp_translate(args):
+    local = local_endpoint(args.provider)
+    if local and not args.database_url:
+        raise SystemExit(
+            f"[JP] TRANSLATE_URL={local} is a local server (e.g. tools/fake_translation_server.py); "
+            "pass --database-url for a scratch database so its output cannot reach the real cache"
+        )
+    eng = create_engine(args.database_url, future=True) if args.database_url else get_engine()
+    t0 = time.perf_counter()
+    try:
+        s = translate_pending(
+            eng,
+            provider=args.provider,
+            batch_size=args.batch_size,
+            limit=args.limit,
+            max_attempts=args.max_attempts,
+            concurrency=args.concurrency,
+        )
+    except TranslatorUnavailable as e:
+        raise SystemExit(f"[JP] {e}")
+    dt = time.perf_counter() - t0
+    ratio = s["seen"] / s["sent"] if s["sent"] else 1.0
+    dup = s["pending_rows"] / s["pending_titles"] if s["pending_titles"] else 1.0
+    print(f"[JP] filled {s['sibling_rows']:,} rows from already-translated titles")
+    print(f"[JP] {s['pending_rows']:,} untranslated rows share {s['pending_titles']:,} distinct titles ({dup:.1f}x)")
+    print(
+        f"[JP] {s['seen']:,} queued titles -> {s['sent']:,} sent after dedup ({ratio:.1f}x); "
+        f"translated {s['translated']:,} ({s['failed']:,} failed) in {dt:.1f}s; "
+        f"title_en filled on {s['rows_updated']:,} rows"
+    )
 
 
 if __name__ == "__main__":
+    def add_loader_args(p):
+        p.add_argument("--loader", choices=LOADERS, default="row",
+                       help="grants_raw loader: per-row upsert or COPY into staging + batched merge")
+        p.add_argument("--batch-size", type=int, default=COPY_BATCH_SIZE,
+                       help=f"rows per COPY batch for --loader copy (default {COPY_BATCH_SIZE})")
+
     ap = ArgumentParser("scrapper")
     sp = ap.add_subparsers(dest="cmd", required=True)
 
     b = sp.add_parser("build", help="ingest specific ZIP files and derive (US)")
     b.add_argument("--grants-zip", required=True)
     b.add_argument("--maint-zip", required=True)
+    add_loader_args(b)
     b.set_defaults(func=cmd_build)
 
     l = sp.add_parser("latest", help="ingest the two ZIPs present in data/downloads/ (US)")
+    add_loader_args(l)
     l.set_defaults(func=cmd_latest)
 
     d = sp.add_parser("ingest-dir", help="ingest ALL grants/maintenance ZIPs in a directory (recursively) (US)")
     d.add_argument("--dir", required=True)
+    add_loader_args(d)
+    d.add_argument("--workers", type=int, default=1,
+                   help="processes parsing grant ZIPs in parallel; one writer loads them in order (default 1)")
     d.set_defaults(func=cmd_ingest_dir)
 
     v = sp.add_parser("verify", help="show 1976–2001 counts in grants_raw and inactive_patents (US)")
     v.set_defaults(func=cmd_verify)
 
-    r = sp.add_parser("derive", help="rebuild inactive_patents from grants_raw + maint_events_raw (US)")
+    r = sp.add_parser("derive", help="update inactive_patents from grants_raw + maint_events_raw (US)")
+    r.add_argument("--full", action="store_true",
+                   help="truncate and rebuild everything instead of applying changes since the last derive")
+    r.add_argument("--swap", action="store_true",
+                   help="with --full: build patents_index as a shadow table and swap it in atomically")
     r.set_defaults(func=cmd_derive)
 
+    x = sp.add_parser("index-rollback", help="swap patents_index_old back in after a derive --full --swap")
+    x.set_defaults(func=cmd_index_rollback)
+
     # NEW
     j = sp.add_parser("jp-ingest", help="ingest JPDRP_YYYYMMDD.tar.gz into patents_index as JP (inactive only)")
     j.add_argument("--jpdrp-tar", required=True, help="Path to JPDRP_YYYYMMDD.tar.gz")
     j.set_defaults(func=cmd_jp_ingest)
 
+    jd = sp.add_parser("jp-ingest-dir", help="ingest ALL JPDRP archives in a directory (recursively), oldest first")
+    jd.add_argument("--dir", required=True)
+    jd.add_argument("--workers", type=int, default=4,
+                    help="processes parsing archive members in parallel; one writer applies them in date order (default 4)")
+    jd.set_defaults(func=cmd_jp_ingest_dir)
+
+    t = sp.add_parser("jp-translate", help="translate queued JP titles and fill patents_index.title_en")
+    t.add_argument("--provider", choices=sorted(TRANSLATORS), default="google")
+    t.add_argument("--batch-size", type=int, default=50, help="queued titles read per round (default 50)")
+    t.add_argument("--concurrency", type=int, default=1,
+                   help="provider requests in flight, within the provider's rate limit (default 1)")
+    t.add_argument("--limit", type=int, default=None, help="stop after this many queued titles")
+    t.add_argument("--max-attempts", type=int, default=3,
+                   help="skip titles that already failed this many runs (default 3)")
+    t.add_argument("--database-url", default=None,
+                   help="database to fill (default DATABASE_URL); required when TRANSLATE_URL is a local server")
+    t.set_defaults(func=cmd_jp_translate)
+
     args = ap.parse_args()
     args.func(args)
\ No newline at end of file
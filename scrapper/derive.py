@@ -1,39 +1,166 @@
 from sqlalchemy import text
 
-EXPIRED_CODES = {"EXP","EXP.","EXP-UNP","EXP-UNE"}  
+from .index_meta import bump_generation, refresh_stats
+from .index_swap import rebuild_index_swap
 
-def rebuild_inactive(engine) -> int:
-    with engine.begin() as conn:
-        conn.execute(text("TRUNCATE inactive_patents"))
-        conn.execute(text("""
-            WITH last_evt AS (
-              SELECT DISTINCT ON (patent) patent, event_code, event_date
-              FROM maint_events_raw
-              ORDER BY patent, event_date DESC
-            ),
-            expired AS (
-              SELECT patent FROM last_evt
-              WHERE upper(event_code) = ANY (:codes)
-            ),
-            aged AS (
-              SELECT patent
-              FROM grants_raw
-              WHERE grant_date IS NOT NULL
-                AND grant_date <= (CURRENT_DATE - INTERVAL '20 years')
-            ),
-            unioned AS (
-              SELECT patent FROM expired
-              UNION
-              SELECT patent FROM aged
-            )
-            INSERT INTO inactive_patents (patent, title, grant_date)
-            SELECT g.patent, g.title, g.grant_date
-            FROM unioned u
-            JOIN grants_raw g ON g.patent = u.patent
-        """), {"codes": list(EXPIRED_CODES)})
-        cnt = conn.execute(text("SELECT count(*) FROM inactive_patents")).scalar_one()
+EXPIRED_CODES = {"EXP","EXP.","EXP-UNP","EXP-UNE"}
+
+# Patents whose grant or maintenance rows changed since the last derive.
+# grants.py / maintenance.py add to it in the same statement as their upserts,
+# setting changed_at to clock_timestamp() on insert and on conflict.
+CHANGED_DDL = """
+    CREATE TABLE IF NOT EXISTS derive_changed_patents (
+        patent     TEXT PRIMARY KEY,
+        changed_at TIMESTAMPTZ DEFAULT clock_timestamp()
+    )
+"""
+
+# Single-row watermark: the day derive last ran, used to find patents that
+# have crossed the 20-year line since then.
+STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS derive_state (
+        id          INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+        last_run_on DATE NOT NULL
+    )
+"""
+
+def ensure_changelog(conn) -> None:
+    conn.execute(text(CHANGED_DDL))
+
+def _rebuild_full(conn, sync_index: bool = True) -> None:
+    conn.execute(text("TRUNCATE inactive_patents"))
+    conn.execute(text("""
+        WITH last_evt AS (
+          SELECT DISTINCT ON (patent) patent, event_code, event_date
+          FROM maint_events_raw
+          ORDER BY patent, event_date DESC
+        ),
+        expired AS (
+          SELECT patent FROM last_evt
+          WHERE upper(event_code) = ANY (:codes)
+        ),
+        aged AS (
+          SELECT patent
+          FROM grants_raw
+          WHERE grant_date IS NOT NULL
+            AND grant_date <= (CURRENT_DATE - INTERVAL '20 years')
+        ),
+        unioned AS (
+          SELECT patent FROM expired
+          UNION
+          SELECT patent FROM aged
+        )
+        INSERT INTO inactive_patents (patent, title, grant_date)
+        SELECT g.patent, g.title, g.grant_date
+        FROM unioned u
+        JOIN grants_raw g ON g.patent = u.patent
+    """), {"codes": list(EXPIRED_CODES)})
+
+    conn.execute(text("TRUNCATE derive_changed_patents"))
+    if not sync_index:
+        return
+
+    # Keep patents_index in sync: replace all US rows with current inactive set
+    conn.execute(text("DELETE FROM patents_index WHERE jurisdiction = 'US'"))
+    conn.execute(text("""
+        INSERT INTO patents_index (jurisdiction, patent_id, title, date, inactive_reason)
+        SELECT 'US', patent, title, grant_date, NULL
+        FROM inactive_patents
+    """))
+
+def _derive_incremental(conn, last_run_on) -> None:
+    """
+    Recompute only patents touched since the last run: everything in
+    derive_changed_patents plus grants that crossed the 20-year line after
+    last_run_on. The result is applied to inactive_patents and the US rows of
+    patents_index as a diff, so untouched rows are never rewritten.
 
-        # Keep patents_index in sync: replace all US rows with current inactive set
+    Changelog entries are cleared only up to the time derive_touched was
+    built: a patent loaded again after that keeps its entry for the next run.
+    """
+    touched_at = conn.execute(text("SELECT clock_timestamp()")).scalar_one()
+    conn.execute(text("""
+        CREATE TEMP TABLE derive_touched ON COMMIT DROP AS
+        SELECT patent FROM derive_changed_patents
+        UNION
+        SELECT patent FROM grants_raw
+        WHERE grant_date >  (CAST(:last_run_on AS date) - INTERVAL '20 years')
+          AND grant_date <= (CURRENT_DATE - INTERVAL '20 years')
+    """), {"last_run_on": last_run_on})
+    conn.execute(text("ANALYZE derive_touched"))
+    conn.execute(text("""
+        CREATE TEMP TABLE derive_desired ON COMMIT DROP AS
+        WITH last_evt AS (
+          SELECT DISTINCT ON (m.patent) m.patent, m.event_code
+          FROM maint_events_raw m
+          JOIN derive_touched t ON t.patent = m.patent
+          ORDER BY m.patent, m.event_date DESC
+        )
+        SELECT g.patent, g.title, g.grant_date
+        FROM derive_touched t
+        JOIN grants_raw g ON g.patent = t.patent
+        LEFT JOIN last_evt e ON e.patent = t.patent
+        WHERE upper(e.event_code) = ANY (:codes)
+           OR (g.grant_date IS NOT NULL
+               AND g.grant_date <= (CURRENT_DATE - INTERVAL '20 years'))
+    """), {"codes": list(EXPIRED_CODES)})
+    conn.execute(text("ALTER TABLE derive_desired ADD PRIMARY KEY (patent)"))
+
+    conn.execute(text("""
+        DELETE FROM inactive_patents i
+        USING derive_touched t
+        WHERE i.patent = t.patent
+          AND NOT EXISTS (SELECT 1 FROM derive_desired d WHERE d.patent = i.patent)
+    """))
+    conn.execute(text("""
+        INSERT INTO inactive_patents (patent, title, grant_date)
+        SELECT patent, title, grant_date FROM derive_desired
+        ON CONFLICT (patent) DO UPDATE
+          SET title = EXCLUDED.title,
+              grant_date = EXCLUDED.grant_date
+          WHERE (inactive_patents.title, inactive_patents.grant_date)
+                IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.grant_date)
+    """))
+
+    conn.execute(text("""
+        DELETE FROM patents_index p
+        USING derive_touched t
+        WHERE p.jurisdiction = 'US'
+          AND p.patent_id = t.patent
+          AND NOT EXISTS (SELECT 1 FROM derive_desired d WHERE d.patent = p.patent_id)
+    """))
+    conn.execute(text("""
+        INSERT INTO patents_index (jurisdiction, patent_id, title, date, inactive_reason)
+        SELECT 'US', patent, title, grant_date, NULL FROM derive_desired
+        ON CONFLICT (jurisdiction, patent_id) DO UPDATE
+          SET title = EXCLUDED.title,
+              date  = EXCLUDED.date
+          WHERE (patents_index.title, patents_index.date)
+                IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.date)
+    """))
+
+    conn.execute(text("""
+        DELETE FROM derive_changed_patents c
+        USING derive_touched t
+        WHERE c.patent = t.patent
+          AND c.changed_at <= :touched_at
+    """), {"touched_at": touched_at})
+
+def rebuild_inactive(engine, full: bool = True, swap_index: bool = False) -> int:
+    """
+    Derive inactive_patents (and the US rows of patents_index) from grants_raw
+    and maint_events_raw.
+
+    full=True truncates and recomputes everything. full=False only applies the
+    changes since the last run, and falls back to a full rebuild if derive has
+    never run. With full=True and swap_index=True, patents_index is not edited
+    in place; it is rebuilt as a shadow table and swapped in (see index_swap).
+    Returns the number of inactive patents.
+    """
+    swap_index = swap_index and full
+    with engine.begin() as conn:
+        ensure_changelog(conn)
+        conn.execute(text(STATE_DDL))
         conn.execute(text("""
             CREATE TABLE IF NOT EXISTS patents_index (
                 jurisdiction    TEXT NOT NULL,
@@ -45,11 +172,22 @@ def rebuild_inactive(engine) -> int:
                 PRIMARY KEY (jurisdiction, patent_id)
             );
         """))
-        conn.execute(text("DELETE FROM patents_index WHERE jurisdiction = 'US'"))
+
+        last_run_on = conn.execute(text("SELECT last_run_on FROM derive_state")).scalar()
+        if full or last_run_on is None:
+            _rebuild_full(conn, sync_index=not swap_index)
+        else:
+            _derive_incremental(conn, last_run_on)
+
         conn.execute(text("""
-            INSERT INTO patents_index (jurisdiction, patent_id, title, date, inactive_reason)
-            SELECT 'US', patent, title, grant_date, NULL
-            FROM inactive_patents
+            INSERT INTO derive_state (id, last_run_on) VALUES (1, CURRENT_DATE)
+            ON CONFLICT (id) DO UPDATE SET last_run_on = EXCLUDED.last_run_on
         """))
+        cnt = conn.execute(text("SELECT count(*) FROM inactive_patents")).scalar_one()
+        if not swap_index:
+            refresh_stats(conn)
+            bump_generation(conn)
 
-        return int(cnt)
\ No newline at end of file
+    if swap_index:
+        rebuild_index_swap(engine)
+    return int(cnt)
@@ -1,3 +1,4 @@
+from collections import Counter
 from pathlib import Path
 from zipfile import ZipFile
 from lxml import etree
@@ -5,6 +6,9 @@ from typing import Optional
 import re
 from sqlalchemy import text
 
+from .bulk import copy_rows
+from .derive import ensure_changelog
+
 def _norm(s: Optional[str]) -> str:
     return (s or "").strip()
 
@@ -22,142 +26,213 @@ def _to_yyyymmdd(s: str) -> Optional[str]:
         return f"{yy}{int(mm):02d}{int(dd):02d}"
     return None
 
+def _xpaths(exprs):
+    """Compile string(...) extractors once; evaluated in order, first non-empty wins."""
+    return tuple(etree.XPath(f"string({xp})") for xp in exprs)
+
+# ---- (1) Modern PTBLXML (kept first in the generic chain) ----
+_PTBL_PN = _xpaths([
+    "//us-bibliographic-data-grant/publication-reference/document-id/doc-number",
+    "//publication-reference/document-id/doc-number",
+    "//*/document-id/doc-number",
+    "//*/doc-number",
+])
+_PTBL_TITLE = _xpaths([
+    "//invention-title",
+    "//*/invention-title",
+    "//*/title",
+])
+_PTBL_GD = _xpaths([
+    "//us-bibliographic-data-grant/publication-reference/document-id/date",
+    "//publication-reference/document-id/date",
+    "//*/document-id/date",
+    "//*/date",
+])
+
+# ---- (2) APS PGB (2002–2004) under PATDOC ----
+# Patent number often under B100/B110/DNUM/PDAT (designs use DNUM),
+# Title under B540/STEXT/PDAT, Date under B140/DATE/PDAT (YYYYMMDD).
+_APS_PN = _xpaths([
+    ".//B100//DNUM/PDAT",
+    ".//B110//DNUM/PDAT",
+    # occasionally plain text under B110/PDAT in some dumps:
+    ".//B110/PDAT",
+])
+_APS_TITLE = _xpaths([
+    ".//B540//STEXT/PDAT",
+    ".//B540/PDAT",
+])
+_APS_GD = _xpaths([
+    ".//B140/DATE/PDAT",
+    ".//B140/PDAT",
+])
+
+# ---- (3) Very generic last-ditch fallback (unchanged) ----
+_GENERIC_PN = _xpaths(["//doc-number"])
+
+# Anchored paths from the document root, tried once the family is known.
+# They resolve the common case without scanning every descendant.
+_ANCHORED = {
+    "ptblxml": (
+        _xpaths(["us-bibliographic-data-grant/publication-reference/document-id/doc-number"]),
+        _xpaths(["us-bibliographic-data-grant/invention-title"]),
+        _xpaths(["us-bibliographic-data-grant/publication-reference/document-id/date"]),
+    ),
+    "aps": (
+        _xpaths(["SDOBI/B100/B110/DNUM/PDAT"]),
+        _xpaths(["SDOBI/B500/B540/STEXT/PDAT"]),
+        _xpaths(["SDOBI/B100/B140/DATE/PDAT"]),
+    ),
+}
+
+# Per-family hit counters: "<family>:anchored", "<family>:fallback", "<family>:miss"
+EXTRACT_STATS: Counter = Counter()
+
+def extractor_stats() -> dict:
+    return dict(EXTRACT_STATS)
+
+def reset_extractor_stats() -> None:
+    EXTRACT_STATS.clear()
+
+def merge_extractor_stats(stats: dict) -> None:
+    """Fold counters reported by a worker process into this process's totals."""
+    EXTRACT_STATS.update(stats)
+
+def _doc_family(root: etree._Element) -> str:
+    tag = root.tag if isinstance(root.tag, str) else ""
+    local = tag.rsplit("}", 1)[-1]
+    if local == "us-patent-grant":
+        return "ptblxml"
+    if local.upper() == "PATDOC":
+        return "aps"
+    return "generic"
+
+def _first_text(root: etree._Element, xpaths) -> str:
+    for xp in xpaths:
+        try:
+            t = xp(root)
+        except Exception:
+            t = ""
+        if t:
+            t = t.strip()
+            if t:
+                return t
+    return ""
+
+def _fields(root: etree._Element, pn_xps, title_xps, gd_xps):
+    pn = _norm(_first_text(root, pn_xps))
+    title = re.sub(r"\s+", " ", _norm(_first_text(root, title_xps)))
+    gd = _to_yyyymmdd(_first_text(root, gd_xps))
+    return pn, title, gd
+
 def _extract_from_tree(root: etree._Element):
     """
     Namespace-agnostic pulls for PN, Title, Grant/Publication Date.
 
-    Order:
+    The document family is detected once from the root tag and its anchored
+    paths are tried first. If any of the three comes up empty, the full chain runs:
       1) Modern PTBLXML (us-patent-grant) fields
       2) APS PGB (2002–2004) fields: PATDOC/B100/B110/DNUM, B540/STEXT, B140/DATE
       3) Very generic fallbacks (unchanged)
+    Which path answered is counted in EXTRACT_STATS.
     """
-    def first_text(path_exprs):
-        for xp in path_exprs:
-            try:
-                t = root.xpath(f"string({xp})")
-            except Exception:
-                t = ""
-            if t:
-                t = t.strip()
-                if t:
-                    return t
-        return ""
-
-    # ---- (1) Modern PTBLXML (your existing paths, kept first) ----
-    pn = first_text([
-        "//us-bibliographic-data-grant/publication-reference/document-id/doc-number",
-        "//publication-reference/document-id/doc-number",
-        "//*/document-id/doc-number",
-        "//*/doc-number",
-    ])
-    title = first_text([
-        "//invention-title",
-        "//*/invention-title",
-        "//*/title",
-    ])
-    gd = first_text([
-        "//us-bibliographic-data-grant/publication-reference/document-id/date",
-        "//publication-reference/document-id/date",
-        "//*/document-id/date",
-        "//*/date",
-    ])
-
-    pn = _norm(pn)
-    title = re.sub(r"\s+", " ", _norm(title))
-    gd = _to_yyyymmdd(gd)
+    family = _doc_family(root)
+    anchored = _ANCHORED.get(family)
+    if anchored:
+        pn, title, gd = _fields(root, *anchored)
+        # An empty anchored date falls through: the chain below also tries
+        # the looser date paths (down to //*/date), as the old parser did.
+        if pn and title and gd:
+            EXTRACT_STATS[f"{family}:anchored"] += 1
+            return pn, title, gd
 
+    pn, title, gd = _fields(root, _PTBL_PN, _PTBL_TITLE, _PTBL_GD)
     if pn and title:
+        EXTRACT_STATS[f"{family}:fallback"] += 1
         return pn, title, gd
 
-    # ---- (2) APS PGB (2002–2004) under PATDOC ----
-    # Patent number often under B100/B110/DNUM/PDAT (designs use DNUM),
-    # Title under B540/STEXT/PDAT, Date under B140/DATE/PDAT (YYYYMMDD).
-    aps_pn = first_text([
-        ".//B100//DNUM/PDAT",
-        ".//B110//DNUM/PDAT",
-        # occasionally plain text under B110/PDAT in some dumps:
-        ".//B110/PDAT",
-    ])
-    aps_title = first_text([
-        ".//B540//STEXT/PDAT",
-        ".//B540/PDAT",
-    ])
-    aps_gd = first_text([
-        ".//B140/DATE/PDAT",
-        ".//B140/PDAT",
-    ])
-
-    aps_pn = _norm(aps_pn)
-    aps_title = re.sub(r"\s+", " ", _norm(aps_title))
-    aps_gd = _to_yyyymmdd(aps_gd)
-
+    aps_pn, aps_title, aps_gd = _fields(root, _APS_PN, _APS_TITLE, _APS_GD)
     if aps_pn and aps_title:
+        EXTRACT_STATS[f"{family}:fallback"] += 1
         return aps_pn, aps_title, aps_gd
 
-    # ---- (3) Very generic last-ditch fallback (unchanged) ----
-    pn = first_text(["//doc-number"])
-    pn = _norm(pn)
+    pn = _norm(_first_text(root, _GENERIC_PN))
     if pn and title:
+        EXTRACT_STATS[f"{family}:fallback"] += 1
         return pn, title, gd
 
+    EXTRACT_STATS[f"{family}:miss"] += 1
     return None, None, None
 
-def _iter_docs(zf: ZipFile, member_name: str):
+SPLIT_CHUNK_SIZE = 1 << 20  # bytes read from the ZIP member per step
+
+_PATDOC_MARKER = re.compile(rb"<PATDOC", re.IGNORECASE)
+_GRANT_MARKER = re.compile(rb"<us-patent-grant")
+
+def _split_stream(fh, marker: re.Pattern, marker_len: int, head: bytes, chunk_size: int = SPLIT_CHUNK_SIZE):
+    """
+    Yield the byte range starting at each `marker` match, reading `fh` in chunks.
+
+    The buffer holds only the unfinished document plus one chunk, so memory is
+    bounded by the largest document rather than the member size. As before,
+    bytes ahead of the first marker are dropped, and a stream with no marker
+    at all is yielded whole.
+    """
+    buf = bytearray(head)
+    keep = marker_len - 1  # a marker may straddle two chunks
+    start = None           # offset of the current document in buf
+    pos = 0                # where the next marker search begins
+    eof = False
+    while True:
+        m = marker.search(buf, pos)
+        if m:
+            i = m.start()
+            if start is not None:
+                yield bytes(buf[start:i])
+            start = i
+            pos = i + marker_len
+            continue
+        if eof:
+            break
+        if start:
+            del buf[:start]
+            pos -= start
+            start = 0
+        pos = max(pos, len(buf) - keep)
+        chunk = fh.read(chunk_size)
+        if chunk:
+            buf += chunk
+        else:
+            eof = True
+
+    yield bytes(buf[start:] if start is not None else buf)
+
+def _iter_docs(zf: ZipFile, member_name: str, chunk_size: int = SPLIT_CHUNK_SIZE):
     """
     Yield each document inside the weekly member.
     - XML weekly: one big XML file containing multiple <us-patent-grant> docs.
     - SGML/XML APS weekly (PGB): repeated <PATDOC>...</PATDOC>.
     We split heuristically, keeping the opening tag with each chunk.
-    """
-    with zf.open(member_name) as fh:
-        data = fh.read()
 
+    The member is streamed (see _split_stream); the APS format is detected from
+    the file name or a case-insensitive <PATDOC in the first chunk.
+    """
     lower_name = member_name.lower()
-    upper = data.upper()
-
-    # APS PGB (2002–2004): PATDOC blocks (present in .sgm and some .xml)
-    if lower_name.endswith(".sgm") or b"<PATDOC" in upper:
-        marker = b"<PATDOC"
-        idxs = []
-        start = 0
-        while True:
-            i = upper.find(marker, start)
-            if i == -1:
-                break
-            idxs.append(i)
-            start = i + len(marker)
-        if not idxs:
-            # Fall back to whole file
-            yield data
+    with zf.open(member_name) as fh:
+        head = fh.read(chunk_size)
+        # APS PGB (2002–2004): PATDOC blocks (present in .sgm and some .xml)
+        if lower_name.endswith(".sgm") or _PATDOC_MARKER.search(head):
+            yield from _split_stream(fh, _PATDOC_MARKER, len(b"<PATDOC"), head, chunk_size)
         else:
-            idxs.append(len(data))
-            for a, b in zip(idxs, idxs[1:]):
-                yield data[a:b]
-        return
-
-    # Modern PTBLXML: us-patent-grant blocks
-    marker = b"<us-patent-grant"
-    idxs = []
-    start = 0
-    while True:
-        i = data.find(marker, start)
-        if i == -1:
-            break
-        idxs.append(i)
-        start = i + len(marker)
-    if not idxs:
-        yield data
-    else:
-        idxs.append(len(data))
-        for a, b in zip(idxs, idxs[1:]):
-            yield data[a:b]
-
-def load_grants(zip_path: Path, engine) -> int:
-    total = 0
-    with ZipFile(zip_path) as zf, engine.begin() as conn:
+            # Modern PTBLXML: us-patent-grant blocks
+            yield from _split_stream(fh, _GRANT_MARKER, len(b"<us-patent-grant"), head, chunk_size)
+
+def _iter_grant_rows(zip_path: Path):
+    """Yield (patent, title, grant_yyyymmdd) for every usable document in a weekly ZIP."""
+    with ZipFile(zip_path) as zf:
         names = [n for n in zf.namelist() if n.lower().endswith((".xml", ".sgm"))]
         if not names:
-            return 0
+            return
         # pick the largest member (unchanged)
         names.sort(key=lambda n: zf.getinfo(n).file_size, reverse=True)
         member = names[0]
@@ -179,13 +254,109 @@ def load_grants(zip_path: Path, engine) -> int:
             pn, title, gd = _extract_from_tree(root)
             if not pn or not title:
                 continue
+            yield pn, title, gd
+
+LOADERS = ("row", "copy")
+COPY_BATCH_SIZE = 5000
+
+# Both loaders record upserted patents in derive_changed_patents in the same
+# statement, so an incremental derive knows what to recompute. changed_at is
+# refreshed on every load, so a derive running meanwhile keeps the entry.
+_UPSERT_ROW_SQL = """
+    WITH up AS (
+        INSERT INTO grants_raw (patent, title, grant_date)
+        VALUES (:pn, :title, to_date(NULLIF(:gd, ''), 'YYYYMMDD'))
+        ON CONFLICT (patent) DO UPDATE
+          SET title = EXCLUDED.title,
+              grant_date = COALESCE(EXCLUDED.grant_date, grants_raw.grant_date)
+        RETURNING patent
+    )
+    INSERT INTO derive_changed_patents (patent, changed_at)
+    SELECT patent, clock_timestamp() FROM up
+    ON CONFLICT (patent) DO UPDATE SET changed_at = EXCLUDED.changed_at
+"""
+
+_STAGE_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS grants_stage (
+        seq        BIGINT,
+        patent     TEXT,
+        title      TEXT,
+        grant_date TEXT
+    ) ON COMMIT DROP
+"""
+
+# Same semantics as the row upsert. DISTINCT ON keeps the last copy of a patent
+# seen in the batch, because ON CONFLICT cannot touch one row twice per statement.
+_MERGE_STAGE_SQL = """
+    WITH up AS (
+        INSERT INTO grants_raw (patent, title, grant_date)
+        SELECT DISTINCT ON (patent) patent, title, to_date(NULLIF(grant_date, ''), 'YYYYMMDD')
+        FROM grants_stage
+        ORDER BY patent, seq DESC
+        ON CONFLICT (patent) DO UPDATE
+          SET title = EXCLUDED.title,
+              grant_date = COALESCE(EXCLUDED.grant_date, grants_raw.grant_date)
+        RETURNING patent
+    )
+    INSERT INTO derive_changed_patents (patent, changed_at)
+    SELECT patent, clock_timestamp() FROM up
+    ON CONFLICT (patent) DO UPDATE SET changed_at = EXCLUDED.changed_at
+"""
 
-            conn.execute(text("""
-                INSERT INTO grants_raw (patent, title, grant_date)
-                VALUES (:pn, :title, to_date(:gd,'YYYYMMDD'))
-                ON CONFLICT (patent) DO UPDATE
-                  SET title = EXCLUDED.title,
-                      grant_date = COALESCE(EXCLUDED.grant_date, grants_raw.grant_date)
-            """), {"pn": pn, "title": title, "gd": gd or ""})
-            total += 1
-    return total
\ No newline at end of file
+def _load_rows_row(rows, conn) -> int:
+    total = 0
+    stmt = text(_UPSERT_ROW_SQL)
+    for pn, title, gd in rows:
+        conn.execute(stmt, {"pn": pn, "title": title, "gd": gd or ""})
+        total += 1
+    return total
+
+def _load_rows_copy(rows, conn, batch_size: int) -> int:
+    total = 0
+    batch = []
+    conn.execute(text(_STAGE_DDL))
+
+    def flush():
+        if not batch:
+            return
+        copy_rows(conn, "grants_stage", ("seq", "patent", "title", "grant_date"), batch)
+        conn.execute(text(_MERGE_STAGE_SQL))
+        conn.execute(text("TRUNCATE grants_stage"))
+        batch.clear()
+
+    for pn, title, gd in rows:
+        batch.append((total, pn, title, gd or ""))
+        total += 1
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return total
+
+def parse_grants_zip(zip_path: Path):
+    """
+    Parse a weekly ZIP into (rows, extractor_stats); top-level so a process pool
+    can run it. The stats are this ZIP's hit counters, for merge_extractor_stats.
+    """
+    before = Counter(EXTRACT_STATS)
+    rows = list(_iter_grant_rows(zip_path))
+    return rows, dict(EXTRACT_STATS - before)
+
+def load_grant_rows(rows, engine, loader: str = "row", batch_size: int = COPY_BATCH_SIZE) -> int:
+    """Upsert already-parsed (patent, title, grant_yyyymmdd) rows into grants_raw in one transaction."""
+    if loader not in LOADERS:
+        raise ValueError(f"unknown loader {loader!r} (expected one of {LOADERS})")
+    with engine.begin() as conn:
+        ensure_changelog(conn)
+        if loader == "copy":
+            return _load_rows_copy(rows, conn, batch_size)
+        return _load_rows_row(rows, conn)
+
+def load_grants(zip_path: Path, engine, loader: str = "row", batch_size: int = COPY_BATCH_SIZE) -> int:
+    """
+    Parse one weekly grant ZIP and upsert it into grants_raw.
+
+    loader="row" issues one INSERT ... ON CONFLICT per document.
+    loader="copy" COPYs batches of `batch_size` rows into a TEMP staging table
+    and merges each batch with a single set-based upsert.
+    """
+    return load_grant_rows(_iter_grant_rows(zip_path), engine, loader=loader, batch_size=batch_size)
@@ -0,0 +1,52 @@
+from sqlalchemy import text
+
+META_DDL = """
+    CREATE TABLE IF NOT EXISTS index_meta (
+        key   TEXT PRIMARY KEY,
+        value BIGINT NOT NULL
+    )
+"""
+
+def bump_generation(conn) -> int:
+    """
+    Increment the patents_index generation. The API polls it and drops its
+    in-process result cache when it changes. Call inside the transaction that
+    changed the index so the bump becomes visible together with the data.
+    """
+    conn.execute(text(META_DDL))
+    return int(conn.execute(text("""
+        INSERT INTO index_meta (key, value) VALUES ('generation', 1)
+        ON CONFLICT (key) DO UPDATE SET value = index_meta.value + 1
+        RETURNING value
+    """)).scalar_one())
+
+# Row counts of patents_index by jurisdiction, inactive_reason and grant year.
+# Served by the API's /stats instead of counting the index on every request.
+STATS_DDL = """
+    CREATE TABLE IF NOT EXISTS patent_stats (
+        jurisdiction    TEXT NOT NULL,
+        inactive_reason TEXT,
+        year            INT,
+        n               BIGINT NOT NULL,
+        refreshed_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+def refresh_stats(conn) -> int:
+    """
+    Recompute patent_stats from patents_index. One grouped scan; the old rows
+    are deleted (not truncated) so readers keep seeing the previous snapshot
+    until the caller's transaction commits. Returns the number of groups.
+    """
+    conn.execute(text(STATS_DDL))
+    # Serialize concurrent refreshes (say derive and jp-ingest-dir from cron):
+    # otherwise the second DELETE misses the first one's new rows and both
+    # INSERTs survive. This mode still lets readers through.
+    conn.execute(text("LOCK TABLE patent_stats IN SHARE ROW EXCLUSIVE MODE"))
+    conn.execute(text("DELETE FROM patent_stats"))
+    return conn.execute(text("""
+        INSERT INTO patent_stats (jurisdiction, inactive_reason, year, n)
+        SELECT jurisdiction, inactive_reason, CAST(extract(year FROM date) AS int), count(*)
+        FROM patents_index
+        GROUP BY 1, 2, 3
+    """)).rowcount
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import re
+
+from sqlalchemy import text
+
+from .index_meta import bump_generation, refresh_stats
+
+LIVE = "patents_index"
+NEXT = "patents_index_next"
+OLD = "patents_index_old"
+SWAP_LOCK_TIMEOUT = "10s"
+
+
+def _index_names(conn, table: str) -> list[str]:
+    return list(conn.execute(text("""
+        SELECT indexname FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = :t
+    """), {"t": table}).scalars())
+
+
+def _rename(conn, table: str, new_table: str, from_suffix: str, to_suffix: str) -> None:
+    """Rename a table and re-suffix its indexes (constraint indexes rename their constraint too)."""
+    for name in _index_names(conn, table):
+        base = name[: -len(from_suffix)] if from_suffix and name.endswith(from_suffix) else name
+        conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{base}{to_suffix}"'))
+    conn.execute(text(f'ALTER TABLE "{table}" RENAME TO "{new_table}"'))
+
+
+def _build_next(conn) -> int:
+    """
+    Fill patents_index_next from inactive_patents (US) plus the live non-US
+    rows, then create the live table's indexes on it and ANALYZE.
+    Loading before indexing keeps the build a plain append.
+    """
+    conn.execute(text(f"DROP TABLE IF EXISTS {NEXT}"))
+    conn.execute(text(f"CREATE TABLE {NEXT} (LIKE {LIVE} INCLUDING DEFAULTS INCLUDING GENERATED)"))
+    conn.execute(text(f"""
+        INSERT INTO {NEXT} (jurisdiction, patent_id, title, title_en, date, inactive_reason)
+        SELECT 'US', patent, title, NULL, grant_date, NULL
+        FROM inactive_patents
+        UNION ALL
+        SELECT jurisdiction, patent_id, title, title_en, date, inactive_reason
+        FROM {LIVE}
+        WHERE jurisdiction <> 'US'
+    """))
+    n = conn.execute(text(f"SELECT count(*) FROM {NEXT}")).scalar_one()
+
+    pk = conn.execute(text("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = CAST(:t AS regclass) AND contype = 'p'
+    """), {"t": LIVE}).scalar()
+    if pk:
+        conn.execute(text(
+            f'ALTER TABLE {NEXT} ADD CONSTRAINT "{pk}_next" PRIMARY KEY (jurisdiction, patent_id)'
+        ))
+
+    defs = conn.execute(text("""
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = :t
+    """), {"t": LIVE}).all()
+    for name, indexdef in defs:
+        if name == pk:
+            continue
+        ddl, count = re.subn(
+            r"^(CREATE (?:UNIQUE )?INDEX )(\S+)( ON (?:ONLY )?)((?:\S+\.)?)patents_index ",
+            lambda m: f'{m.group(1)}"{name}_next"{m.group(3)}{m.group(4)}{NEXT} ',
+            indexdef,
+        )
+        if not count:
+            raise RuntimeError(f"cannot rewrite index definition for {NEXT}: {indexdef}")
+        conn.execute(text(ddl))
+
+    conn.execute(text(f"ANALYZE {NEXT}"))
+    return int(n)
+
+
+def _refresh_stats(engine) -> None:
+    # Kept out of the swap transaction so the full scan does not extend the
+    # ACCESS EXCLUSIVE lock; bumps again so /stats is re-read.
+    with engine.begin() as conn:
+        refresh_stats(conn)
+        bump_generation(conn)
+
+
+def rebuild_index_swap(engine) -> int:
+    """
+    Rebuild patents_index without touching the live table, then swap it in.
+
+    The new table is built, indexed and analyzed as patents_index_next while
+    /search keeps reading the live one. The swap is a few renames inside one
+    short transaction. The previous table is kept as patents_index_old for
+    rollback_index_swap().
+
+    Non-US rows are copied from the live table at build time, so this should
+    not run at the same time as a JP ingest. Returns the row count of the new
+    table.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {OLD}"))
+        n = _build_next(conn)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+        conn.execute(text(f"LOCK TABLE {LIVE} IN ACCESS EXCLUSIVE MODE"))
+        _rename(conn, LIVE, OLD, "", "_old")
+        _rename(conn, NEXT, LIVE, "_next", "")
+        bump_generation(conn)
+    _refresh_stats(engine)
+    return n
+
+
+def rollback_index_swap(engine) -> None:
+    """Swap patents_index_old back in; the replaced table becomes patents_index_old."""
+    with engine.begin() as conn:
+        if not conn.execute(text("SELECT to_regclass(:t)"), {"t": OLD}).scalar():
+            raise RuntimeError(f"{OLD} does not exist; nothing to roll back to")
+        conn.execute(text(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'"))
+        conn.execute(text(f"LOCK TABLE {LIVE}, {OLD} IN ACCESS EXCLUSIVE MODE"))
+        _rename(conn, LIVE, "patents_index_swap", "", "_swap")
+        _rename(conn, OLD, LIVE, "_old", "")
+        _rename(conn, "patents_index_swap", OLD, "_swap", "_old")
+        bump_generation(conn)
+    _refresh_stats(engine)
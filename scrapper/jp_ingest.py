@@ -3,13 +3,18 @@ from __future__ import annotations
 import os
 import re
 import tarfile
-import time
 from dataclasses import dataclass
-from datetime import date, datetime
+from datetime import date
+from operator import itemgetter
+from pathlib import Path
 from typing import Iterable, List, Optional
 
 from sqlalchemy import create_engine, text
 
+from .bulk import copy_rows
+from .index_meta import bump_generation, refresh_stats
+from .translate import NO_TITLE, cached_translations, enqueue_untranslated, ensure_translation_tables
+
 
 def _env_database_url() -> str:
     url = os.getenv("DATABASE_URL")
@@ -22,18 +27,25 @@ def get_engine():
     return create_engine(_env_database_url(), future=True)
 
 
-def _to_date_yyyymmdd(s: str) -> Optional[date]:
+def _to_date_yyyymmdd(s) -> Optional[date]:
+    """YYYYMMDD (str or bytes) -> date; None for blanks, all zeros and invalid dates."""
     s = (s or "").strip()
-    if not s or s == "00000000":
-        return None
-    if not re.fullmatch(r"\d{8}", s):
+    if len(s) != 8 or not s.isdigit():
         return None
     try:
-        return datetime.strptime(s, "%Y%m%d").date()
-    except Exception:
+        return date(int(s[:4]), int(s[4:6]), int(s[6:]))
+    except ValueError:
         return None
 
 
+def _years_before(d: date, years: int) -> date:
+    """Same day `years` earlier; Feb 29 becomes Feb 28 (like date - interval in Postgres)."""
+    try:
+        return d.replace(year=d.year - years)
+    except ValueError:
+        return d.replace(year=d.year - years, day=28)
+
+
 def _is_all_zeros_digits(x: str) -> bool:
     """
     Returns True if x contains only digits and all are '0'
@@ -111,46 +123,13 @@ def _is_inactive_reason(
     if conti_prd_expire_ymd and conti_prd_expire_ymd <= today:
         return "TERM"
 
-    if app_year_month_day:
+    if app_year_month_day and app_year_month_day <= _years_before(today, 20):
         # fallback: 20-year age check like US (approx)
-        try:
-            if app_year_month_day <= date(today.year - 20, today.month, today.day):
-                return "TERM"
-        except Exception:
-            if app_year_month_day.year <= today.year - 20:
-                return "TERM"
+        return "TERM"
 
     return None
 
 
-def _translate_titles(titles: List[str]) -> List[Optional[str]]:
-    """
-    Translate a list of Japanese titles to English using Google Translate (free).
-    Returns a list of the same length; entries are None if translation failed.
-    Translates in sub-batches of 50 to stay within free API limits.
-    """
-    try:
-        from deep_translator import GoogleTranslator
-    except ImportError:
-        return [None] * len(titles)
-
-    results: List[Optional[str]] = []
-    chunk_size = 50
-    for i in range(0, len(titles), chunk_size):
-        chunk = titles[i : i + chunk_size]
-        try:
-            translated = GoogleTranslator(source="ja", target="en").translate_batch(chunk)
-            for orig, en in zip(chunk, translated):
-                # If translation returned the same string or empty, store None
-                results.append(en if en and en.strip() and en.strip() != orig else None)
-        except Exception:
-            results.extend([None] * len(chunk))
-        if i + chunk_size < len(titles):
-            time.sleep(0.5)  # be polite to the free API between chunks
-
-    return results
-
-
 @dataclass
 class JpRow:
     patent_id: str
@@ -160,109 +139,189 @@ class JpRow:
     inactive_reason: str
 
 
-def _iter_mgt_rows_from_member(tf: tarfile.TarFile, member_name: str, today: date) -> Iterable[JpRow]:
+MGT_MEMBERS = ("upd_mgt_info_p.tsv", "upd_mgt_info_u.tsv")
+
+MGT_COLUMNS = (
+    "reg_num",
+    "app_num",
+    "conti_prd_expire_ymd",
+    "next_pen_pymnt_tm_lmt_ymd",
+    "app_year_month_day",
+    "app_exam_pub_num",
+    "app_exam_pub_year_month_day",
+    "set_reg_year_month_day",
+    "invent_title_etc",
+)
+
+
+def _raw_on_or_before(raw: bytes, limit: bytes) -> Optional[date]:
     """
-    Parse one TSV member (upd_mgt_info_p.tsv or upd_mgt_info_u.tsv) and yield inactive records.
-    TSV is UTF-8 with BOM (utf-8-sig).
+    Date of a raw YYYYMMDD field if it is on or before `limit` (also raw
+    YYYYMMDD). For well-formed dates byte order is date order, so rows that
+    fail the comparison are rejected without building a date.
     """
-    m = tf.getmember(member_name)
-    f = tf.extractfile(m)
-    if f is None:
-        return
+    raw = raw.strip()
+    if len(raw) != 8 or raw > limit or not raw.isdigit():
+        return None
+    return _to_date_yyyymmdd(raw)
+
 
+def _iter_mgt_rows(f, member_name: str, today: date) -> Iterable[JpRow]:
+    """
+    Parse a JPDRP management TSV from a binary file object and yield inactive records.
+
+    Works on raw bytes and only splits as far as the last needed column.
+    The inactivity predicates run first, on the raw date fields (the same
+    rules as _is_inactive_reason). Titles, ids and display dates are decoded
+    only for rows that turn out inactive, which are a minority of each file.
+    """
     header_line = f.readline().decode("utf-8-sig", errors="replace").rstrip("\n\r")
     cols = header_line.split("\t")
     idx = {c: i for i, c in enumerate(cols)}
-
-    required = [
-        "reg_num",
-        "app_num",
-        "conti_prd_expire_ymd",
-        "next_pen_pymnt_tm_lmt_ymd",
-        "app_year_month_day",
-        "app_exam_pub_num",
-        "app_exam_pub_year_month_day",
-        "set_reg_year_month_day",
-        "invent_title_etc",
-    ]
-    for r in required:
+    for r in MGT_COLUMNS:
         if r not in idx:
             raise RuntimeError(f"[JPDRP] Missing required column '{r}' in {member_name}")
 
-    for raw in f:
-        line = raw.decode("utf-8", errors="replace").rstrip("\n\r")
-        if not line:
-            continue
-        parts = line.split("\t")
-        if len(parts) < len(cols):
-            continue
-
-        reg_num = parts[idx["reg_num"]].strip()
-        app_num = parts[idx["app_num"]].strip()
-
-        conti = _to_date_yyyymmdd(parts[idx["conti_prd_expire_ymd"]])
-        next_pen = _to_date_yyyymmdd(parts[idx["next_pen_pymnt_tm_lmt_ymd"]])
-        app_dt = _to_date_yyyymmdd(parts[idx["app_year_month_day"]])
-
-        pub_num = parts[idx["app_exam_pub_num"]].strip()
-        pub_dt = _to_date_yyyymmdd(parts[idx["app_exam_pub_year_month_day"]])
-
-        set_reg_dt = _to_date_yyyymmdd(parts[idx["set_reg_year_month_day"]])
-
-        title = (parts[idx["invent_title_etc"]] or "").strip()
-        title = re.sub(r"\s+", " ", title)
+    positions = [idx[c] for c in MGT_COLUMNS]
+    project = itemgetter(*positions)
+    maxsplit = max(positions) + 1
+    min_tabs = len(cols) - 1
+    today_b = today.strftime("%Y%m%d").encode()
+    cutoff_b = _years_before(today, 20).strftime("%Y%m%d").encode()
 
-        reason = _is_inactive_reason(conti, next_pen, app_dt, today)
-        if not reason:
+    for raw in f:
+        line = raw.rstrip(b"\n\r")
+        if not line or line.count(b"\t") < min_tabs:
             continue
+        reg_num, app_num, conti, next_pen, app_ymd, pub_num, pub_ymd, set_reg_ymd, title_b = project(
+            line.split(b"\t", maxsplit)
+        )
 
-        patent_id = _pick_patent_id(pub_num, reg_num, app_num)
-        display_date = _pick_display_date(pub_dt, set_reg_dt, app_dt)
-
-        if not title:
-            title = "(no title)"
+        # FEES first, then TERM (expiry, or filed 20+ years ago); an invalid
+        # date falls through to the next rule like a missing one
+        app_dt = None
+        if _raw_on_or_before(next_pen, today_b):
+            reason = "FEES"
+        elif _raw_on_or_before(conti, today_b):
+            reason = "TERM"
+        else:
+            app_dt = _raw_on_or_before(app_ymd, cutoff_b)
+            if app_dt is None:
+                continue
+            reason = "TERM"
+        if app_dt is None:
+            app_dt = _to_date_yyyymmdd(app_ymd)
+
+        patent_id = _pick_patent_id(
+            pub_num.decode("ascii", errors="replace"),
+            reg_num.decode("ascii", errors="replace"),
+            app_num.decode("ascii", errors="replace"),
+        )
+        display_date = _pick_display_date(_to_date_yyyymmdd(pub_ymd), _to_date_yyyymmdd(set_reg_ymd), app_dt)
+        title = " ".join(title_b.decode("utf-8", errors="replace").split()) or NO_TITLE
 
         yield JpRow(
             patent_id=patent_id,
             title=title,
-            title_en=None,  # filled in during flush
+            title_en=None,  # filled from title_translations during flush
             date=display_date,
             inactive_reason=reason,
         )
 
 
+def _iter_mgt_rows_from_member(tf: tarfile.TarFile, member_name: str, today: date) -> Iterable[JpRow]:
+    """
+    Parse one TSV member (upd_mgt_info_p.tsv or upd_mgt_info_u.tsv) and yield inactive records.
+    TSV is UTF-8 with BOM (utf-8-sig).
+    """
+    f = tf.extractfile(tf.getmember(member_name))
+    if f is None:
+        return
+    yield from _iter_mgt_rows(f, member_name, today)
+
+
+# A row whose title is unchanged keeps its title_en when the new one is NULL.
+_ON_CONFLICT_SQL = """
+    ON CONFLICT (jurisdiction, patent_id) DO UPDATE
+      SET title           = EXCLUDED.title,
+          title_en        = CASE
+                              WHEN patents_index.title = EXCLUDED.title
+                              THEN COALESCE(EXCLUDED.title_en, patents_index.title_en)
+                              ELSE EXCLUDED.title_en
+                            END,
+          date            = EXCLUDED.date,
+          inactive_reason = EXCLUDED.inactive_reason
+"""
+
+
+# Archives already applied by jp-ingest / jp-ingest-dir; jp-ingest-dir skips them on reruns.
+STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS jp_ingest_state (
+        archive      TEXT PRIMARY KEY,
+        archive_date DATE,
+        rows         BIGINT NOT NULL,
+        applied_at   TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+
+def _record_archive(conn, archive: Path, rows: int) -> None:
+    conn.execute(
+        text("""
+            INSERT INTO jp_ingest_state (archive, archive_date, rows)
+            VALUES (:archive, :archive_date, :rows)
+            ON CONFLICT (archive) DO UPDATE
+              SET archive_date = EXCLUDED.archive_date,
+                  rows         = EXCLUDED.rows,
+                  applied_at   = now()
+        """),
+        {"archive": archive.name, "archive_date": archive_date(archive), "rows": rows},
+    )
+
+
+def _ensure_tables(conn) -> None:
+    conn.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS patents_index (
+                jurisdiction    TEXT NOT NULL,
+                patent_id       TEXT NOT NULL,
+                title           TEXT,
+                title_en        TEXT,
+                date            DATE,
+                inactive_reason TEXT,
+                PRIMARY KEY (jurisdiction, patent_id)
+            );
+            """
+        )
+    )
+    # Add title_en column if the table already exists without it
+    conn.execute(
+        text(
+            "ALTER TABLE patents_index ADD COLUMN IF NOT EXISTS title_en TEXT;"
+        )
+    )
+    ensure_translation_tables(conn)
+    conn.execute(text(STATE_DDL))
+
+
 def ingest_jpdrp_to_index(jpdrp_tar_gz: str) -> int:
     """
     Ingest JPDRP daily update (tar.gz) into patents_index as jurisdiction='JP',
     inserting ONLY inactive (TERM/FEES) records.
 
+    title_en comes from the title_translations cache; titles not in it are
+    queued for `jp-translate` (scrapper/translate.py). A row whose title is
+    unchanged keeps its existing title_en. The archive is recorded in
+    jp_ingest_state, so a later jp-ingest-dir over the same files skips it.
+
     Returns number of upserted rows attempted.
     """
     eng = get_engine()
     today = date.today()
 
     with eng.begin() as conn:
-        conn.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS patents_index (
-                    jurisdiction    TEXT NOT NULL,
-                    patent_id       TEXT NOT NULL,
-                    title           TEXT,
-                    title_en        TEXT,
-                    date            DATE,
-                    inactive_reason TEXT,
-                    PRIMARY KEY (jurisdiction, patent_id)
-                );
-                """
-            )
-        )
-        # Add title_en column if the table already exists without it
-        conn.execute(
-            text(
-                "ALTER TABLE patents_index ADD COLUMN IF NOT EXISTS title_en TEXT;"
-            )
-        )
+        _ensure_tables(conn)
 
     total = 0
     row_batch: List[JpRow] = []
@@ -271,39 +330,37 @@ def ingest_jpdrp_to_index(jpdrp_tar_gz: str) -> int:
         nonlocal row_batch, total
         if not row_batch:
             return
-        # Translate Japanese titles to English in bulk before inserting
-        english = _translate_titles([r.title for r in row_batch])
-        dicts = [
-            {
-                "patent_id": r.patent_id,
-                "title": r.title,
-                "title_en": en,
-                "date": r.date,
-                "inactive_reason": r.inactive_reason,
-            }
-            for r, en in zip(row_batch, english)
-        ]
         with eng.begin() as conn:
+            # Titles already in the cache are filled in here; everything else is
+            # queued for `jp-translate`, so ingest never waits on a translator.
+            cached = cached_translations(conn, (r.title for r in row_batch))
+            dicts = [
+                {
+                    "patent_id": r.patent_id,
+                    "title": r.title,
+                    "title_en": cached.get(r.title),
+                    "date": r.date,
+                    "inactive_reason": r.inactive_reason,
+                }
+                for r in row_batch
+            ]
             conn.execute(
                 text(
                     """
                     INSERT INTO patents_index (jurisdiction, patent_id, title, title_en, date, inactive_reason)
                     VALUES ('JP', :patent_id, :title, :title_en, :date, :inactive_reason)
-                    ON CONFLICT (jurisdiction, patent_id) DO UPDATE
-                      SET title           = EXCLUDED.title,
-                          title_en        = EXCLUDED.title_en,
-                          date            = EXCLUDED.date,
-                          inactive_reason = EXCLUDED.inactive_reason;
                     """
+                    + _ON_CONFLICT_SQL
                 ),
                 dicts,
             )
+            enqueue_untranslated(conn, [r.patent_id for r in row_batch])
         total += len(row_batch)
         row_batch = []
 
     with tarfile.open(jpdrp_tar_gz, "r:gz") as tf:
         names = [m.name for m in tf.getmembers() if m.isfile()]
-        targets = [n for n in names if n.endswith("upd_mgt_info_p.tsv") or n.endswith("upd_mgt_info_u.tsv")]
+        targets = [n for n in names if n.endswith(MGT_MEMBERS)]
         if not targets:
             raise RuntimeError("JPDRP tar.gz did not contain upd_mgt_info_p.tsv or upd_mgt_info_u.tsv")
 
@@ -315,13 +372,114 @@ def ingest_jpdrp_to_index(jpdrp_tar_gz: str) -> int:
 
         flush()
 
+    with eng.begin() as conn:
+        _record_archive(conn, Path(jpdrp_tar_gz), total)
+    finish_jp_ingest(eng)
     return total
 
 
+_STAGE_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS jp_stage (
+        seq             BIGINT,
+        patent_id       TEXT,
+        title           TEXT,
+        date            DATE,
+        inactive_reason TEXT
+    ) ON COMMIT DROP
+"""
+
+# DISTINCT ON keeps the last copy of a patent in the archive (ON CONFLICT
+# cannot touch one row twice per statement); title_en comes from the cache.
+_MERGE_STAGE_SQL = """
+    INSERT INTO patents_index (jurisdiction, patent_id, title, title_en, date, inactive_reason)
+    SELECT DISTINCT ON (s.patent_id) 'JP', s.patent_id, s.title, t.en, s.date, s.inactive_reason
+    FROM jp_stage s
+    LEFT JOIN title_translations t ON t.ja_hash = md5(s.title) AND t.ja = s.title
+    ORDER BY s.patent_id, s.seq DESC
+""" + _ON_CONFLICT_SQL
+
+_ENQUEUE_STAGE_SQL = """
+    INSERT INTO title_translation_queue (ja_hash, ja)
+    SELECT DISTINCT md5(p.title), p.title
+    FROM patents_index p
+    JOIN (SELECT DISTINCT patent_id FROM jp_stage) s ON s.patent_id = p.patent_id
+    WHERE p.jurisdiction = 'JP'
+      AND p.title_en IS NULL
+      AND p.title IS NOT NULL
+      AND p.title <> :no_title
+    ON CONFLICT (ja_hash) DO NOTHING
+"""
+
+
+def archive_date(path: Path) -> Optional[date]:
+    """The YYYYMMDD in JPDRP_YYYYMMDD.tar.gz, if the name has one."""
+    m = re.search(r"(\d{8})", path.name)
+    return _to_date_yyyymmdd(m.group(1)) if m else None
+
+
+def jpdrp_archives(root: Path) -> List[Path]:
+    """JPDRP *.tar.gz files under root, oldest archive date first."""
+    archives = [p for p in root.rglob("*.tar.gz") if "jpdrp" in p.name.lower()]
+    return sorted(archives, key=lambda p: (archive_date(p) or date.min, p.name))
+
+
+def applied_archives(engine) -> set:
+    with engine.begin() as conn:
+        _ensure_tables(conn)
+        return set(conn.execute(text("SELECT archive FROM jp_ingest_state")).scalars())
+
+
+def parse_jpdrp_member(tar_path: str, member_suffix: str, today: date):
+    """
+    Parse the member of one archive whose name ends with `member_suffix` into
+    (patent_id, title, date, inactive_reason) tuples, or None if the archive
+    has no such member. Top-level so a process pool can run it; the archive is
+    read as a stream, so only the data up to that member is decompressed.
+    """
+    with tarfile.open(tar_path, "r|gz") as tf:
+        for m in tf:
+            if m.isfile() and m.name.endswith(member_suffix):
+                f = tf.extractfile(m)
+                return [
+                    (r.patent_id, r.title, r.date, r.inactive_reason)
+                    for r in _iter_mgt_rows(f, m.name, today)
+                ]
+    return None
+
+
+def load_jp_archive(rows, engine, archive: Path) -> int:
+    """
+    Apply one archive's parsed rows (members in order) in a single transaction:
+    COPY into a staging table, one set-based upsert, queue untranslated titles
+    and record the archive in jp_ingest_state. Returns the rows staged.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(_STAGE_DDL))
+        n = copy_rows(
+            conn,
+            "jp_stage",
+            ("seq", "patent_id", "title", "date", "inactive_reason"),
+            ((seq,) + row for seq, row in enumerate(rows)),
+        )
+        conn.execute(text(_MERGE_STAGE_SQL))
+        conn.execute(text(_ENQUEUE_STAGE_SQL), {"no_title": NO_TITLE})
+        _record_archive(conn, archive, n)
+    return n
+
+
+def finish_jp_ingest(engine) -> None:
+    with engine.begin() as conn:
+        refresh_stats(conn)
+        bump_generation(conn)
+
+
+# Run from the repo root as `python -m scrapper.jp_ingest --jpdrp-tar ...`
+# (the relative imports need the package; `python scrapper/jp_ingest.py`
+# fails). `python -m scrapper.cli jp-ingest` does the same.
 if __name__ == "__main__":
     import argparse
 
-    ap = argparse.ArgumentParser("jp_ingest")
+    ap = argparse.ArgumentParser("python -m scrapper.jp_ingest")
     ap.add_argument("--jpdrp-tar", required=True, help="Path to JPDRP_YYYYMMDD.tar.gz")
     args = ap.parse_args()
 
@@ -1,9 +1,14 @@
+from dataclasses import dataclass
+from datetime import date
 from pathlib import Path
 from zipfile import ZipFile
 from io import TextIOWrapper
 from sqlalchemy import text
 import re
 
+from .bulk import copy_rows
+from .derive import ensure_changelog
+
 def _norm(s): return (s or "").strip().upper()
 
 def _to_yyyymmdd(s: str):
@@ -20,40 +25,137 @@ def _to_yyyymmdd(s: str):
         return f"{yy}{int(mm):02d}{int(dd):02d}"
     return None
 
-def load_maintenance(zip_path: Path, engine) -> int:
-    """Handles the USPTO fixed-width, space-separated maintenance file (e.g., MaintFeeEvents_YYYYMMDD.txt)."""
-    count = 0
-    with ZipFile(zip_path) as zf, engine.begin() as conn:
+MAINT_BATCH_SIZE = 50000
+UNIQUE_INDEX = "maint_events_raw_event_uniq"
+
+@dataclass
+class MaintLoadStats:
+    read: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+
+    def add(self, other: "MaintLoadStats") -> None:
+        self.read += other.read
+        self.inserted += other.inserted
+        self.duplicates += other.duplicates
+        self.rejected += other.rejected
+
+def _parse_line(line: str):
+    """One MaintFeeEvents line -> (patent, code, event_date), or None if unusable."""
+    parts = line.split()
+    if len(parts) < 6:
+        return None
+    pn   = parts[1]
+    dt   = _to_yyyymmdd(parts[-2])
+    code = _norm(parts[-1])
+    if not pn or not dt or not code:
+        return None
+    try:
+        d = date(int(dt[:4]), int(dt[4:6]), int(dt[6:8]))
+    except ValueError:
+        return None
+    return pn, code, d
+
+def _ensure_unique_key(conn) -> None:
+    """
+    (patent, event_code, event_date) identifies an event, which makes re-ingesting
+    the same or an overlapping weekly file a no-op. Tables loaded before the key
+    existed may hold duplicates, so those are collapsed once before creating it.
+    """
+    if conn.execute(text("SELECT to_regclass(:n)"), {"n": UNIQUE_INDEX}).scalar():
+        return
+    conn.execute(text("""
+        DELETE FROM maint_events_raw
+        WHERE ctid IN (
+            SELECT ctid FROM (
+                SELECT ctid, row_number() OVER (
+                    PARTITION BY patent, event_code, event_date ORDER BY ctid
+                ) AS rn
+                FROM maint_events_raw
+            ) d
+            WHERE d.rn > 1
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX}
+        ON maint_events_raw (patent, event_code, event_date)
+    """))
+
+def load_maintenance_stats(zip_path: Path, engine, batch_size: int = MAINT_BATCH_SIZE) -> MaintLoadStats:
+    """
+    Handles the USPTO fixed-width, space-separated maintenance file (e.g., MaintFeeEvents_YYYYMMDD.txt).
+
+    Lines are parsed into batches of `batch_size`, COPYed into a TEMP staging
+    table and merged with ON CONFLICT DO NOTHING. Each batch commits on its own,
+    so a failure never silently discards the rest of the file and a rerun only
+    fills in what is missing. Returns the read / inserted / duplicate /
+    rejected line counts.
+    """
+    stats = MaintLoadStats()
+    with ZipFile(zip_path) as zf:
         names = [n for n in zf.namelist() if n.lower().endswith((".txt", ".csv"))]
         if not names:
-            return 0
+            return stats
         names.sort(key=lambda n: zf.getinfo(n).file_size, reverse=True)
         name = names[0]
 
-        lines = 0
-        with zf.open(name) as fh:
-            for raw in TextIOWrapper(fh, encoding="utf-8", errors="ignore"):
-                lines += 1
-                line = raw.strip()
-                if not line:
-                    continue
-                parts = line.split()
-                if len(parts) < 6:
-                    continue
-                pn   = parts[1]
-                dt   = _to_yyyymmdd(parts[-2])
-                code = _norm(parts[-1])
-                if not pn or not dt or not code:
-                    continue
-                try:
-                    conn.execute(text("""
-                        INSERT INTO maint_events_raw (patent, event_code, event_date, details)
-                        VALUES (:pn, :code, to_date(:dt,'YYYYMMDD'), NULL)
-                    """), {"pn": pn, "code": code, "dt": dt})
-                    count += 1
-                except Exception:
-                    pass
-
-                if lines % 100000 == 0:
-                    print(f"[maint] read={lines:,} inserted={count:,}", flush=True)
-    return count
\ No newline at end of file
+        with engine.connect() as conn:
+            with conn.begin():
+                _ensure_unique_key(conn)
+                ensure_changelog(conn)
+                conn.execute(text("""
+                    CREATE TEMP TABLE IF NOT EXISTS maint_stage (
+                        patent     TEXT,
+                        event_code TEXT,
+                        event_date DATE
+                    ) ON COMMIT DELETE ROWS
+                """))
+
+            batch = []
+
+            def flush():
+                if not batch:
+                    return
+                with conn.begin():
+                    copy_rows(conn, "maint_stage", ("patent", "event_code", "event_date"), batch)
+                    inserted = conn.execute(text("""
+                        WITH ins AS (
+                            INSERT INTO maint_events_raw (patent, event_code, event_date)
+                            SELECT DISTINCT patent, event_code, event_date FROM maint_stage
+                            ON CONFLICT (patent, event_code, event_date) DO NOTHING
+                            RETURNING patent
+                        ),
+                        changed AS (
+                            INSERT INTO derive_changed_patents (patent, changed_at)
+                            SELECT DISTINCT patent, clock_timestamp() FROM ins
+                            ON CONFLICT (patent) DO UPDATE SET changed_at = EXCLUDED.changed_at
+                        )
+                        SELECT count(*) FROM ins
+                    """)).scalar_one()
+                stats.inserted += inserted
+                stats.duplicates += len(batch) - inserted
+                batch.clear()
+                print(f"[maint] read={stats.read:,} inserted={stats.inserted:,} "
+                      f"duplicates={stats.duplicates:,} rejected={stats.rejected:,}", flush=True)
+
+            with zf.open(name) as fh:
+                for raw in TextIOWrapper(fh, encoding="utf-8", errors="ignore"):
+                    line = raw.strip()
+                    if not line:
+                        continue
+                    stats.read += 1
+                    row = _parse_line(line)
+                    if row is None:
+                        stats.rejected += 1
+                        continue
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        flush()
+            flush()
+
+    return stats
+
+def load_maintenance(zip_path: Path, engine, batch_size: int = MAINT_BATCH_SIZE) -> int:
+    """load_maintenance_stats, returning only the number of newly inserted events."""
+    return load_maintenance_stats(zip_path, engine, batch_size).inserted
@@ -0,0 +1,476 @@
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import ipaddress
+import os
+import random
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import text
+
+from .index_meta import bump_generation
+
+NO_TITLE = "(no title)"
+
+HTTP_TIMEOUT = 15     # seconds per provider request
+BACKOFF_BASE = 1.0    # first retry waits up to this long, doubling after
+BACKOFF_MAX = 60.0
+DEFAULT_TRANSLATE_URL = "http://127.0.0.1:5005/translate"
+
+# Content-addressed cache of title translations: ja_hash is md5(ja), so SQL
+# can join patents_index rows to it with md5(title) as well.
+TRANSLATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS title_translations (
+        ja_hash  TEXT PRIMARY KEY,
+        ja       TEXT NOT NULL,
+        en       TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        ts       TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+# Distinct titles waiting for jp-translate. JP ingest adds to it; entries
+# leave it once translated, or stay with attempts bumped when the provider
+# returns nothing.
+QUEUE_DDL = """
+    CREATE TABLE IF NOT EXISTS title_translation_queue (
+        ja_hash   TEXT PRIMARY KEY,
+        ja        TEXT NOT NULL,
+        attempts  INT NOT NULL DEFAULT 0,
+        queued_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+UNTRANSLATED_IDX_DDL = """
+    CREATE INDEX IF NOT EXISTS patents_index_jp_untranslated_idx
+    ON patents_index (patent_id)
+    WHERE jurisdiction = 'JP' AND title_en IS NULL
+"""
+
+
+def ja_hash(ja: str) -> str:
+    """Same value as md5(ja) in PostgreSQL (UTF-8 database)."""
+    return hashlib.md5(ja.encode("utf-8")).hexdigest()
+
+
+def ensure_translation_tables(conn) -> None:
+    """Create the cache, the queue and the partial index (patents_index must exist)."""
+    conn.execute(text(TRANSLATIONS_DDL))
+    conn.execute(text(QUEUE_DDL))
+    conn.execute(text(UNTRANSLATED_IDX_DDL))
+
+
+# ---------------------------------------------------------------------------
+# Providers. A provider call takes one chunk of Japanese titles and returns a
+# list of the same length (None where there is no usable translation), or
+# raises so the caller can back off and retry.
+# ---------------------------------------------------------------------------
+
+class TranslateError(RuntimeError):
+    """A provider call failed; retry_after is set when the provider asked us to wait."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TranslatorUnavailable(RuntimeError):
+    """The provider's client library is not installed."""
+
+
+def _clean(originals: List[str], translations: Iterable) -> List[Optional[str]]:
+    # An empty result or the input echoed back is not a translation
+    return [
+        en.strip() if isinstance(en, str) and en.strip() and en.strip() != orig else None
+        for orig, en in zip(originals, translations)
+    ]
+
+
+def _call_google(titles: List[str]) -> List[Optional[str]]:
+    """
+    Google Translate (free endpoint) via deep-translator. Its translate_batch
+    is one request per title anyway, so chunks are size 1 and the bucket
+    limits real requests.
+    """
+    from deep_translator import GoogleTranslator
+
+    translator = GoogleTranslator(source="ja", target="en")
+    return _clean(titles, [translator.translate(t) for t in titles])
+
+
+def _call_mymemory(titles: List[str]) -> List[Optional[str]]:
+    """MyMemory via deep-translator; it has no batch endpoint, so chunks are size 1."""
+    from deep_translator import MyMemoryTranslator
+
+    translator = MyMemoryTranslator(source="ja-JP", target="en-GB")
+    return _clean(titles, [translator.translate(t) for t in titles])
+
+
+def _call_http(titles: List[str]) -> List[Optional[str]]:
+    """
+    LibreTranslate-compatible endpoint at TRANSLATE_URL: POST {"q": [...],
+    "source": "ja", "target": "en"} -> {"translatedText": [...]}. Also what
+    tools/fake_translation_server.py serves.
+    """
+    import requests
+
+    url = os.getenv("TRANSLATE_URL", DEFAULT_TRANSLATE_URL)
+    payload = {"q": titles, "source": "ja", "target": "en", "format": "text"}
+    if os.getenv("TRANSLATE_API_KEY"):
+        payload["api_key"] = os.getenv("TRANSLATE_API_KEY")
+    r = requests.post(url, json=payload, timeout=HTTP_TIMEOUT)
+    if r.status_code == 429 or r.status_code >= 500:
+        retry_after = r.headers.get("Retry-After")
+        raise TranslateError(
+            f"{url} returned {r.status_code}",
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+    r.raise_for_status()
+    out = r.json()["translatedText"]
+    return _clean(titles, out if isinstance(out, list) else [out])
+
+
+def local_endpoint(provider: str) -> Optional[str]:
+    """
+    TRANSLATE_URL if `provider` is http and the URL points at this machine,
+    as it does by default for tools/fake_translation_server.py. Its answers
+    would be cached and written to title_en like real ones, so callers only
+    run it against an explicitly named scratch database.
+    """
+    if provider != "http":
+        return None
+    url = os.getenv("TRANSLATE_URL", DEFAULT_TRANSLATE_URL)
+    host = urlsplit(url).hostname or ""
+    if host == "localhost":
+        return url
+    try:
+        return url if ipaddress.ip_address(host).is_loopback else None
+    except ValueError:
+        return None
+
+
+STUB_PROVIDER = "stub"
+
+
+def stub_translate(titles: List[str]) -> List[Optional[str]]:
+    """
+    Deterministic offline translator for tests: pass it as translate= with
+    provider=STUB_PROVIDER. Not a provider choice. Its output is cached like
+    any provider's, so only run it against a throwaway database.
+    """
+    return [f"[en] {t}" for t in titles]
+
+
+@dataclass(frozen=True)
+class Provider:
+    call: Callable[[List[str]], List[Optional[str]]]
+    chunk_size: int  # titles per call; each call is one HTTP request
+    rate: float      # requests per second, shared by all threads of this process
+    burst: int
+    requires: Optional[str] = None  # module that must be importable
+
+
+PROVIDERS: Dict[str, Provider] = {
+    "google": Provider(_call_google, chunk_size=1, rate=2.0, burst=4, requires="deep_translator"),
+    "mymemory": Provider(_call_mymemory, chunk_size=1, rate=5.0, burst=5, requires="deep_translator"),
+    "http": Provider(_call_http, chunk_size=50, rate=50.0, burst=50),
+}
+TRANSLATORS = tuple(PROVIDERS)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `burst` banked."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _backoff(attempt: int, retry_after: Optional[float] = None) -> float:
+    if retry_after is not None:
+        return retry_after
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def get_translator(
+    provider: str,
+    concurrency: int = 1,
+    rate: Optional[float] = None,
+    retries: int = 4,
+) -> Callable[[List[str]], List[Optional[str]]]:
+    """
+    Return translate(titles) -> list of Optional[str] for `provider`.
+
+    Titles are split into the provider's chunk size and sent by up to
+    `concurrency` threads. Every request (including retries) takes a token
+    from the provider's bucket, `rate` requests/s overriding its default. A failed
+    call is retried `retries` times with exponential backoff (or the
+    provider's Retry-After); chunks that still fail come back as None.
+    """
+    try:
+        p = PROVIDERS[provider]
+    except KeyError:
+        raise ValueError(f"unknown translator {provider!r} (expected one of {TRANSLATORS})") from None
+    if p.requires and importlib.util.find_spec(p.requires) is None:
+        # Checked up front: counting these as provider failures would burn
+        # the queue's attempts without saying why
+        raise TranslatorUnavailable(f"translator {provider!r} needs {p.requires}; run: pip install deep-translator")
+    bucket = TokenBucket(rate or p.rate, p.burst if rate is None else max(1, int(rate)))
+
+    def call_chunk(chunk: List[str]) -> List[Optional[str]]:
+        for attempt in range(retries + 1):
+            bucket.acquire()
+            try:
+                return p.call(chunk)
+            except ImportError:
+                raise
+            except Exception as e:
+                if attempt == retries:
+                    break
+                time.sleep(_backoff(attempt, getattr(e, "retry_after", None)))
+        return [None] * len(chunk)
+
+    def translate(titles: List[str]) -> List[Optional[str]]:
+        chunks = [titles[i : i + p.chunk_size] for i in range(0, len(titles), p.chunk_size)]
+        if concurrency <= 1 or len(chunks) <= 1:
+            results = [call_chunk(c) for c in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(call_chunk, chunks))
+        return [en for chunk in results for en in chunk]
+
+    return translate
+
+
+def normalize_title(title: str) -> str:
+    """NFKC plus collapsed whitespace, so full-width and half-width spellings match."""
+    return " ".join(unicodedata.normalize("NFKC", title).split())
+
+
+def translate_unique(
+    translate: Callable[[List[str]], List[Optional[str]]],
+    titles: List[str],
+) -> Tuple[List[Optional[str]], int]:
+    """
+    Send each distinct normalized title to `translate` once and fan the
+    results back out. Returns (results aligned with titles, titles sent).
+    """
+    keys = [normalize_title(t) for t in titles]
+    unique = list(dict.fromkeys(keys))
+    english = dict(zip(unique, translate(unique))) if unique else {}
+    return [english[k] for k in keys], len(unique)
+
+
+# ---------------------------------------------------------------------------
+# Cache and queue
+# ---------------------------------------------------------------------------
+
+def cached_translations(conn, titles: Iterable[str]) -> Dict[str, str]:
+    """Look titles up in title_translations; returns {ja: en} for the hits."""
+    by_hash = {ja_hash(t): t for t in set(titles) if t and t != NO_TITLE}
+    if not by_hash:
+        return {}
+    rows = conn.execute(
+        text("SELECT ja_hash, ja, en FROM title_translations WHERE ja_hash = ANY(:hashes)"),
+        {"hashes": list(by_hash)},
+    )
+    return {ja: en for h, ja, en in rows if by_hash.get(h) == ja}
+
+
+def enqueue_untranslated(conn, patent_ids: List[str]) -> int:
+    """
+    Queue the titles of the given JP rows that still have no title_en.
+    Run after the upsert so rows that kept an existing translation are skipped.
+    """
+    if not patent_ids:
+        return 0
+    return conn.execute(
+        text("""
+            INSERT INTO title_translation_queue (ja_hash, ja)
+            SELECT DISTINCT md5(title), title
+            FROM patents_index
+            WHERE jurisdiction = 'JP'
+              AND patent_id = ANY(:ids)
+              AND title_en IS NULL
+              AND title IS NOT NULL
+              AND title <> :no_title
+            ON CONFLICT (ja_hash) DO NOTHING
+        """),
+        {"ids": patent_ids, "no_title": NO_TITLE},
+    ).rowcount
+
+
+def store_translations(conn, pairs: Dict[str, str], provider: str) -> int:
+    """
+    Insert {ja: en} into the cache and take those titles off the queue.
+    Returns the titles newly cached (ones already there are left as they are).
+    """
+    if not pairs:
+        return 0
+    hashes = [ja_hash(ja) for ja in pairs]
+    stored = conn.execute(
+        text("""
+            INSERT INTO title_translations (ja_hash, ja, en, provider)
+            SELECT h, ja, en, :provider
+            FROM unnest(CAST(:hashes AS text[]), CAST(:ja AS text[]), CAST(:en AS text[])) AS v(h, ja, en)
+            ON CONFLICT (ja_hash) DO NOTHING
+        """),
+        {"hashes": hashes, "ja": list(pairs), "en": list(pairs.values()), "provider": provider},
+    ).rowcount
+    conn.execute(
+        text("DELETE FROM title_translation_queue WHERE ja_hash = ANY(:hashes)"),
+        {"hashes": hashes},
+    )
+    return stored
+
+
+def apply_translations(conn) -> int:
+    """Copy cached translations onto JP rows whose title_en is still NULL."""
+    return conn.execute(text("""
+        UPDATE patents_index p
+        SET title_en = t.en
+        FROM title_translations t
+        WHERE p.jurisdiction = 'JP'
+          AND p.title_en IS NULL
+          AND t.ja_hash = md5(p.title)
+          AND t.ja = p.title
+    """)).rowcount
+
+
+def pending_title_counts(conn) -> Tuple[int, int]:
+    """(untranslated JP rows, distinct titles among them)."""
+    rows, titles = conn.execute(
+        text("""
+            SELECT count(*), count(DISTINCT title)
+            FROM patents_index
+            WHERE jurisdiction = 'JP'
+              AND title_en IS NULL
+              AND title IS NOT NULL
+              AND title <> :no_title
+        """),
+        {"no_title": NO_TITLE},
+    ).one()
+    return int(rows), int(titles)
+
+
+def fill_from_siblings(conn) -> Tuple[int, int]:
+    """
+    Fill untranslated JP rows from other JP rows with exactly the same title
+    that already have a title_en (e.g. from before the cache existed): those
+    translations are copied into title_translations, then applied.
+    Returns (titles added to the cache, rows filled).
+    """
+    seeded = conn.execute(text("""
+        INSERT INTO title_translations (ja_hash, ja, en, provider)
+        SELECT DISTINCT ON (p.title) md5(p.title), p.title, p.title_en, 'sibling'
+        FROM patents_index p
+        WHERE p.jurisdiction = 'JP'
+          AND p.title_en IS NOT NULL
+          AND p.title IN (
+              SELECT title FROM patents_index
+              WHERE jurisdiction = 'JP' AND title_en IS NULL
+          )
+        ORDER BY p.title, p.patent_id
+        ON CONFLICT (ja_hash) DO NOTHING
+    """)).rowcount
+    return seeded, apply_translations(conn)
+
+
+def translate_pending(
+    engine,
+    provider: str = "google",
+    translate: Optional[Callable[[List[str]], List[Optional[str]]]] = None,
+    batch_size: int = 50,
+    limit: Optional[int] = None,
+    max_attempts: int = 3,
+    concurrency: int = 1,
+) -> Dict[str, int]:
+    """
+    Work through title_translation_queue: translate each queued title once,
+    store it in title_translations, then fill title_en on every JP row with
+    that title and bump the index generation. Rows with an already-translated
+    sibling are filled first, and titles that normalize the same are sent once.
+
+    `translate` overrides the provider function (the provider name is still
+    what gets recorded in the cache); otherwise get_translator(provider,
+    concurrency) is used. Titles the provider cannot translate
+    stay queued until they have failed `max_attempts` runs. Returns counts:
+    queued titles seen, titles sent, translated, failed, rows filled from
+    siblings, untranslated rows / distinct titles before the run, and rows
+    updated from the cache. "translated" counts titles actually stored.
+    """
+    translate = translate or get_translator(provider, concurrency=concurrency)
+    stats = {"seen": 0, "sent": 0, "translated": 0, "failed": 0, "sibling_rows": 0, "rows_updated": 0}
+    with engine.begin() as conn:
+        ensure_translation_tables(conn)
+        _, stats["sibling_rows"] = fill_from_siblings(conn)
+        if stats["sibling_rows"]:
+            bump_generation(conn)
+        stats["pending_rows"], stats["pending_titles"] = pending_title_counts(conn)
+        # Anything translated since it was queued never reaches the provider
+        conn.execute(text("""
+            DELETE FROM title_translation_queue q
+            USING title_translations t
+            WHERE t.ja_hash = q.ja_hash
+        """))
+
+    last = ""
+    while limit is None or stats["seen"] < limit:
+        n = batch_size if limit is None else min(batch_size, limit - stats["seen"])
+        with engine.connect() as conn:
+            batch = conn.execute(
+                text("""
+                    SELECT ja_hash, ja FROM title_translation_queue
+                    WHERE ja_hash > :last AND attempts < :max_attempts
+                    ORDER BY ja_hash
+                    LIMIT :n
+                """),
+                {"last": last, "max_attempts": max_attempts, "n": n},
+            ).all()
+        if not batch:
+            break
+        last = batch[-1][0]
+
+        titles = [ja for _, ja in batch]
+        english, sent = translate_unique(translate, titles)
+        done = {ja: en for ja, en in zip(titles, english) if en}
+        failed = [h for h, ja in batch if ja not in done]
+        with engine.begin() as conn:
+            stored = store_translations(conn, done, provider)
+            if failed:
+                conn.execute(
+                    text("UPDATE title_translation_queue SET attempts = attempts + 1 WHERE ja_hash = ANY(:hashes)"),
+                    {"hashes": failed},
+                )
+        stats["seen"] += len(batch)
+        stats["sent"] += sent
+        stats["translated"] += stored
+        stats["failed"] += len(failed)
+
+    with engine.begin() as conn:
+        stats["rows_updated"] = apply_translations(conn)
+        if stats["rows_updated"]:
+            bump_generation(conn)
+    return stats
@@ -2,141 +2,206 @@
 backfill_jp_translations.py
 
 Fills in title_en for all JP rows in patents_index where title_en IS NULL.
-Run this once after adding the translation feature to jp_ingest.py.
+
+Pending rows are read in pages by keyset (patent_id > last key) through the
+partial index on untranslated JP rows, so memory stays flat however many
+rows are missing. JP rows that share a title with an already-translated row
+are filled up front by one SQL update, and titles found in the
+title_translations cache need no provider call. Within each page identical
+(normalized) titles are sent once and the result fanned back to every row.
+Provider calls go out as up to --concurrency requests at a time, limited by
+the provider's token bucket (--rate overrides it) and retried with
+exponential backoff. Each page is written with one UPDATE ... FROM
+(VALUES ...) per 1,000 rows, in the same transaction that stores the new
+translations in the cache and bumps the index generation.
+
+The run is resumable: a restart skips every row already written, and
+--after resumes from the last key printed. Titles the provider could not
+translate stay NULL and are retried on the next run.
 
 Usage:
     python tools/backfill_jp_translations.py
-    python tools/backfill_jp_translations.py --batch-size 100 --pause 1.0
+    python tools/backfill_jp_translations.py --provider google --concurrency 4 --rate 2
+    python tools/backfill_jp_translations.py --after JP2004123456
+
+    # against the local fake server; its "[en] ..." answers are cached and
+    # written like real ones, so a local TRANSLATE_URL needs a scratch database
+    python tools/fake_translation_server.py --rate 20 &
+    TRANSLATE_URL=http://127.0.0.1:5005/translate \\
+        python tools/backfill_jp_translations.py --provider http --concurrency 16 \\
+        --database-url postgresql+psycopg://localhost/patents_scratch
 """
 from __future__ import annotations
 
 import argparse
 import os
+import sys
 import time
-import requests as _requests
 from pathlib import Path
 
-# Patch requests with a default timeout so translation calls never hang forever
-_original_get = _requests.get
-def _get_with_timeout(*args, **kwargs):
-    kwargs.setdefault("timeout", 15)
-    return _original_get(*args, **kwargs)
-_requests.get = _get_with_timeout
-
 from dotenv import load_dotenv
 
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
 # Try all known .env locations in priority order
 for _env in [ROOT / ".env", ROOT / "backend" / ".env", ROOT / "scrapper" / ".env"]:
     if _env.exists():
         load_dotenv(_env, override=False)
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from scrapper.index_meta import bump_generation  # noqa: E402
+from scrapper.translate import (  # noqa: E402
+    NO_TITLE,
+    TRANSLATORS,
+    TranslatorUnavailable,
+    cached_translations,
+    ensure_translation_tables,
+    fill_from_siblings,
+    get_translator,
+    local_endpoint,
+    pending_title_counts,
+    store_translations,
+    translate_unique,
+)
 
+UPDATE_CHUNK = 1000
 
-def get_engine():
-    url = os.getenv("DATABASE_URL")
+
+def get_engine(url: str | None = None):
+    url = url or os.getenv("DATABASE_URL")
     if not url:
         raise RuntimeError("DATABASE_URL is not set.")
     return create_engine(url, future=True)
 
 
-def _clean(translations: list, originals: list) -> list[str | None]:
-    return [
-        en if en and en.strip() and en.strip() != orig else None
-        for orig, en in zip(originals, translations)
-    ]
-
-
-def translate_batch(titles: list[str]) -> list[str | None]:
-    try:
-        from deep_translator import GoogleTranslator, MyMemoryTranslator
-    except ImportError:
-        print("  [warn] deep-translator not installed. Run: pip install deep-translator")
-        return [None] * len(titles)
-
-    # Try Google first
-    try:
-        translated = GoogleTranslator(source="ja", target="en").translate_batch(titles)
-        return _clean(translated, titles)
-    except Exception as e:
-        print(f"  [warn] Google Translate failed ({type(e).__name__}: {e}), trying MyMemory...")
-
-    # Fallback: MyMemory (translate one at a time — its batch calls translate individually anyway)
-    results: list[str | None] = []
-    translator = MyMemoryTranslator(source="ja-JP", target="en-GB")
-    for orig in titles:
-        try:
-            en = translator.translate(orig)
-            results.append(en if en and en.strip() and en.strip() != orig else None)
-        except Exception:
-            results.append(None)
-        time.sleep(0.1)  # MyMemory rate limit is generous but be polite
-    return results
-
-
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--batch-size", type=int, default=10,
-                    help="Titles to translate per API call (default 10)")
-    ap.add_argument("--pause", type=float, default=0.5,
-                    help="Seconds to sleep between batches (default 0.5)")
-    args = ap.parse_args()
-
-    eng = get_engine()
-
-    # Fetch all JP rows with no English title
-    with eng.connect() as conn:
-        rows = conn.execute(text("""
+def fetch_page(conn, after: str, n: int):
+    return conn.execute(
+        text("""
             SELECT patent_id, title
             FROM patents_index
             WHERE jurisdiction = 'JP'
               AND title_en IS NULL
+              AND patent_id > :after
               AND title IS NOT NULL
-              AND title != '(no title)'
+              AND title <> :no_title
             ORDER BY patent_id
-        """)).fetchall()
+            LIMIT :n
+        """),
+        {"after": after, "no_title": NO_TITLE, "n": n},
+    ).all()
+
+
+def write_titles(conn, pairs: list[tuple[str, str]]) -> int:
+    """UPDATE ... FROM (VALUES ...) in chunks; rows that gained a title_en meanwhile are left alone."""
+    written = 0
+    for i in range(0, len(pairs), UPDATE_CHUNK):
+        chunk = pairs[i : i + UPDATE_CHUNK]
+        values = ", ".join(f"(:p{j}, :e{j})" for j in range(len(chunk)))
+        params = {}
+        for j, (pid, en) in enumerate(chunk):
+            params[f"p{j}"] = pid
+            params[f"e{j}"] = en
+        written += conn.execute(
+            text(f"""
+                UPDATE patents_index p
+                SET title_en = v.title_en
+                FROM (VALUES {values}) AS v(patent_id, title_en)
+                WHERE p.jurisdiction = 'JP'
+                  AND p.patent_id = v.patent_id
+                  AND p.title_en IS NULL
+            """),
+            params,
+        ).rowcount
+    return written
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--provider", choices=TRANSLATORS, default="google")
+    ap.add_argument("--concurrency", type=int, default=4,
+                    help="translation requests in flight (default 4)")
+    ap.add_argument("--rate", type=float, default=None,
+                    help="provider requests/s across all threads (default: the provider's limit)")
+    ap.add_argument("--retries", type=int, default=4,
+                    help="retries per request, with exponential backoff (default 4)")
+    ap.add_argument("--page-size", type=int, default=2000,
+                    help="pending rows read per keyset page (default 2000)")
+    ap.add_argument("--after", default="",
+                    help="resume after this patent_id (printed with every page)")
+    ap.add_argument("--limit", type=int, default=None, help="stop after this many rows")
+    ap.add_argument("--database-url", default=None,
+                    help="database to fill (default DATABASE_URL); required when TRANSLATE_URL is a local server")
+    args = ap.parse_args()
 
-    total = len(rows)
-    if total == 0:
+    local = local_endpoint(args.provider)
+    if local and not args.database_url:
+        raise SystemExit(
+            f"TRANSLATE_URL={local} is a local server (e.g. tools/fake_translation_server.py); "
+            "pass --database-url for a scratch database so its output cannot reach the real cache"
+        )
+
+    try:
+        translate = get_translator(args.provider, concurrency=args.concurrency, rate=args.rate, retries=args.retries)
+    except TranslatorUnavailable as e:
+        raise SystemExit(str(e))
+
+    eng = get_engine(args.database_url)
+    with eng.begin() as conn:
+        ensure_translation_tables(conn)
+        seeded, filled = fill_from_siblings(conn)
+        if filled:
+            bump_generation(conn)
+        pending_rows, pending_titles = pending_title_counts(conn)
+    print(f"Filled {filled:,} rows from {seeded:,} already-translated titles.")
+    if pending_titles:
+        print(f"{pending_rows:,} rows pending, {pending_titles:,} distinct titles "
+              f"({pending_rows / pending_titles:.1f}x duplication)")
+
+    seen = written = from_cache = sent = unique = 0
+    after = args.after
+    t0 = time.perf_counter()
+    while args.limit is None or seen < args.limit:
+        n = args.page_size if args.limit is None else min(args.page_size, args.limit - seen)
+        with eng.connect() as conn:
+            page = fetch_page(conn, after, n)
+            cached = cached_translations(conn, (title for _, title in page))
+        if not page:
+            break
+        after = page[-1][0]
+
+        todo = [(pid, title) for pid, title in page if title not in cached]
+        english, n_unique = translate_unique(translate, [title for _, title in todo])
+        new = {title: en for (_, title), en in zip(todo, english) if en}
+        pairs = [(pid, cached.get(title) or new.get(title)) for pid, title in page]
+        pairs = [(pid, en) for pid, en in pairs if en]
+
+        with eng.begin() as conn:
+            store_translations(conn, new, args.provider)
+            w = write_titles(conn, pairs)
+            if w:
+                bump_generation(conn)
+
+        seen += len(page)
+        written += w
+        from_cache += len(page) - len(todo)
+        sent += len(todo)
+        unique += n_unique
+        minutes = (time.perf_counter() - t0) / 60
+        print(
+            f"  {seen:,} rows, {written:,} written ({from_cache:,} from cache, {sent:,} -> {unique:,} unique"
+            f" sent to {args.provider})"
+            f"  {seen / minutes if minutes else 0:,.0f} titles/min  last={after}",
+            flush=True,
+        )
+
+    if not seen:
         print("Nothing to backfill — all JP rows already have title_en.")
         return
-
-    print(f"Backfilling {total:,} JP patents...")
-    updated = 0
-
-    for i in range(0, total, args.batch_size):
-        chunk = rows[i : i + args.batch_size]
-        ids = [r[0] for r in chunk]
-        titles = [r[1] for r in chunk]
-
-        translations = translate_batch(titles)
-
-        pairs = [
-            {"patent_id": pid, "title_en": en}
-            for pid, en in zip(ids, translations)
-            if en is not None
-        ]
-
-        if pairs:
-            with eng.begin() as conn:
-                conn.execute(
-                    text("""
-                        UPDATE patents_index
-                        SET title_en = :title_en
-                        WHERE jurisdiction = 'JP' AND patent_id = :patent_id
-                    """),
-                    pairs,
-                )
-            updated += len(pairs)
-
-        done = min(i + args.batch_size, total)
-        print(f"  {done:,}/{total:,} processed, {updated:,} translations written")
-
-        if done < total:
-            time.sleep(args.pause)
-
-    print(f"Done. {updated:,} of {total:,} rows now have an English title.")
+    minutes = (time.perf_counter() - t0) / 60
+    if unique:
+        print(f"Dedup: {sent:,} titles translated with {unique:,} provider lookups ({sent / unique:.1f}x).")
+    print(f"Done. {written:,} of {seen:,} rows now have an English title ({seen / minutes:,.0f} titles/min).")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+"""
+bench_extract.py
+
+Micro-benchmark for scrapper.grants._extract_from_tree: docs/sec of the old
+f-string XPath chain vs the precompiled, family-aware extractor over a corpus
+of synthetic PTBLXML and APS PGB documents. Also checks both return the same
+fields and prints the per-family hit counters.
+
+Usage:
+    python tools/bench_extract.py
+    python tools/bench_extract.py --docs 20000 --aps-share 0.3
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from lxml import etree
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from bench_iter_docs import APS_DOC, PTBL_DOC  # noqa: E402
+from scrapper.grants import (  # noqa: E402
+    _extract_from_tree, _norm, _to_yyyymmdd, extractor_stats, reset_extractor_stats,
+)
+
+
+def legacy_extract_from_tree(root):
+    """The pre-compilation extractor: builds and evaluates every XPath string per call."""
+    def first_text(path_exprs):
+        for xp in path_exprs:
+            try:
+                t = root.xpath(f"string({xp})")
+            except Exception:
+                t = ""
+            if t:
+                t = t.strip()
+                if t:
+                    return t
+        return ""
+
+    pn = _norm(first_text([
+        "//us-bibliographic-data-grant/publication-reference/document-id/doc-number",
+        "//publication-reference/document-id/doc-number",
+        "//*/document-id/doc-number",
+        "//*/doc-number",
+    ]))
+    title = re.sub(r"\s+", " ", _norm(first_text(["//invention-title", "//*/invention-title", "//*/title"])))
+    gd = _to_yyyymmdd(first_text([
+        "//us-bibliographic-data-grant/publication-reference/document-id/date",
+        "//publication-reference/document-id/date",
+        "//*/document-id/date",
+        "//*/date",
+    ]))
+    if pn and title:
+        return pn, title, gd
+
+    aps_pn = _norm(first_text([".//B100//DNUM/PDAT", ".//B110//DNUM/PDAT", ".//B110/PDAT"]))
+    aps_title = re.sub(r"\s+", " ", _norm(first_text([".//B540//STEXT/PDAT", ".//B540/PDAT"])))
+    aps_gd = _to_yyyymmdd(first_text([".//B140/DATE/PDAT", ".//B140/PDAT"]))
+    if aps_pn and aps_title:
+        return aps_pn, aps_title, aps_gd
+
+    pn = _norm(first_text(["//doc-number"]))
+    if pn and title:
+        return pn, title, gd
+    return None, None, None
+
+
+def make_corpus(docs: int, aps_share: float, filler_bytes: int):
+    filler = ("lorem ipsum " * (filler_bytes // 12 + 1))[:filler_bytes]
+    parser = etree.XMLParser(recover=True, huge_tree=True)
+    every_aps = int(1 / aps_share) if aps_share > 0 else 0
+    roots = []
+    for n in range(docs):
+        template = APS_DOC if every_aps and n % every_aps == 0 else PTBL_DOC
+        roots.append(etree.fromstring(template.format(n=n, filler=filler).encode("utf-8"), parser=parser))
+    return roots
+
+
+def bench(fn, roots, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for r in roots:
+            fn(r)
+        best = min(best, time.perf_counter() - t0)
+    return len(roots) / best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=5000, help="documents in the corpus (default 5000)")
+    ap.add_argument("--aps-share", type=float, default=0.2, help="fraction of APS PGB documents (default 0.2)")
+    ap.add_argument("--doc-bytes", type=int, default=4000, help="filler bytes per document (default 4000)")
+    ap.add_argument("--repeat", type=int, default=3, help="timing repetitions, best is reported (default 3)")
+    args = ap.parse_args()
+
+    roots = make_corpus(args.docs, args.aps_share, args.doc_bytes)
+    mismatches = sum(1 for r in roots if legacy_extract_from_tree(r) != _extract_from_tree(r))
+    print(f"corpus: {len(roots):,} docs, field mismatches old vs new: {mismatches}")
+
+    old = bench(legacy_extract_from_tree, roots, args.repeat)
+    reset_extractor_stats()
+    new = bench(_extract_from_tree, roots, 1)
+    stats = extractor_stats()
+    new = max(new, bench(_extract_from_tree, roots, args.repeat))
+    print(f"  legacy       {old:,.0f} docs/sec")
+    print(f"  precompiled  {new:,.0f} docs/sec  ({new / old:.1f}x)")
+    print("  hits (one pass): " + ", ".join(f"{k}={v:,}" for k, v in sorted(stats.items())))
+
+
+if __name__ == "__main__":
+    main()
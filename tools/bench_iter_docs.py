@@ -0,0 +1,119 @@
+"""
+bench_iter_docs.py
+
+Compares the old read-everything document splitter with the streaming
+scrapper.grants._iter_docs on a synthetic weekly IPG ZIP: docs/sec and peak
+Python memory (tracemalloc) for each.
+
+Usage:
+    python tools/bench_iter_docs.py
+    python tools/bench_iter_docs.py --docs 20000 --aps
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from zipfile import ZipFile, ZIP_DEFLATED
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from scrapper.grants import _iter_docs  # noqa: E402
+
+PTBL_DOC = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE us-patent-grant SYSTEM "us-patent-grant-v45-2014-04-03.dtd" [ ]>
+<us-patent-grant lang="EN" dtd-version="v4.5 2014-04-03" file="US{n:08d}-20240102.XML">
+<us-bibliographic-data-grant>
+<publication-reference><document-id><country>US</country><doc-number>{n:08d}</doc-number><kind>B2</kind><date>20240102</date></document-id></publication-reference>
+<invention-title id="d2e53">Synthetic apparatus number {n}</invention-title>
+</us-bibliographic-data-grant>
+<abstract id="abstract"><p id="p-0001" num="0000">{filler}</p></abstract>
+</us-patent-grant>
+"""
+
+APS_DOC = """<PATDOC DTD="2.4" STATUS="BUILD 20020101">
+<SDOBI><B100><B110><DNUM><PDAT>{n:08d}</PDAT></DNUM></B110><B140><DATE><PDAT>20020101</PDAT></DATE></B140></B100>
+<B500><B540><STEXT><PDAT>Synthetic apparatus number {n}</PDAT></STEXT></B540></B500></SDOBI>
+<SDOAB><BTEXT><PARA><PTEXT><PDAT>{filler}</PDAT></PTEXT></PARA></BTEXT></SDOAB>
+</PATDOC>
+"""
+
+
+def legacy_iter_docs(zf: ZipFile, member_name: str):
+    """The pre-streaming splitter: whole member in memory plus an upper() copy."""
+    with zf.open(member_name) as fh:
+        data = fh.read()
+
+    lower_name = member_name.lower()
+    upper = data.upper()
+
+    if lower_name.endswith(".sgm") or b"<PATDOC" in upper:
+        haystack, marker = upper, b"<PATDOC"
+    else:
+        haystack, marker = data, b"<us-patent-grant"
+    idxs = []
+    start = 0
+    while True:
+        i = haystack.find(marker, start)
+        if i == -1:
+            break
+        idxs.append(i)
+        start = i + len(marker)
+    if not idxs:
+        yield data
+        return
+    idxs.append(len(data))
+    for a, b in zip(idxs, idxs[1:]):
+        yield data[a:b]
+
+
+def make_zip(path: Path, docs: int, aps: bool, filler_bytes: int) -> str:
+    template = APS_DOC if aps else PTBL_DOC
+    member = "pgb_synthetic.sgm" if aps else "ipg_synthetic.xml"
+    filler = ("lorem ipsum " * (filler_bytes // 12 + 1))[:filler_bytes]
+    with ZipFile(path, "w", compression=ZIP_DEFLATED) as zf:
+        with zf.open(member, "w", force_zip64=True) as out:
+            for n in range(docs):
+                out.write(template.format(n=n, filler=filler).encode("utf-8"))
+    return member
+
+
+def run(splitter, zip_path: Path, member: str):
+    t0 = time.perf_counter()
+    with ZipFile(zip_path) as zf:
+        n = sum(1 for _ in splitter(zf, member))
+    elapsed = time.perf_counter() - t0
+
+    tracemalloc.start()
+    with ZipFile(zip_path) as zf:
+        for _ in splitter(zf, member):
+            pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return n, elapsed, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=10000, help="documents in the synthetic member (default 10000)")
+    ap.add_argument("--doc-bytes", type=int, default=8000, help="filler bytes per document (default 8000)")
+    ap.add_argument("--aps", action="store_true", help="generate an APS <PATDOC> member instead of PTBLXML")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path = Path(tmp) / "synthetic.zip"
+        member = make_zip(zip_path, args.docs, args.aps, args.doc_bytes)
+        size = ZipFile(zip_path).getinfo(member).file_size
+        print(f"member {member}: {args.docs:,} docs, {size / 2**20:,.1f} MiB uncompressed")
+
+        for label, fn in (("legacy", legacy_iter_docs), ("streaming", _iter_docs)):
+            n, elapsed, peak = run(fn, zip_path, member)
+            print(f"  {label:<10} docs={n:,}  {n / elapsed:,.0f} docs/sec  peak={peak / 2**20:,.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+bench_jp_parse.py
+
+Rows/sec of the JPDRP management TSV parser on a synthetic
+upd_mgt_info_p.tsv: the old per-line decode / full split / strptime parser
+against the byte-level, column-projected scrapper.jp_ingest._iter_mgt_rows.
+Both are fed the same file, and their outputs are compared row by row.
+
+The synthetic file has --cols columns (the nine the parser needs plus
+filler) and roughly --inactive of its rows inactive: about a third each
+past the fee deadline, expired, or filed more than 20 years ago.
+
+Usage:
+    python tools/bench_jp_parse.py
+    python tools/bench_jp_parse.py --rows 3000000 --cols 60 --inactive 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from scrapper.jp_ingest import (  # noqa: E402
+    MGT_COLUMNS,
+    JpRow,
+    _is_inactive_reason,
+    _iter_mgt_rows,
+    _pick_display_date,
+    _pick_patent_id,
+)
+
+TITLES = ["半導体装置", "画像形成装置", "内燃機関の制御装置", "電池　用　電極", "光ファイバ", "表示装置及びその製造方法"]
+
+
+# --- the parser as it was before the byte-level rewrite --------------------
+
+def legacy_to_date(s: str):
+    s = (s or "").strip()
+    if not s or s == "00000000":
+        return None
+    if not re.fullmatch(r"\d{8}", s):
+        return None
+    try:
+        return datetime.strptime(s, "%Y%m%d").date()
+    except Exception:
+        return None
+
+
+def legacy_iter(f, today: date):
+    cols = f.readline().decode("utf-8-sig", errors="replace").rstrip("\n\r").split("\t")
+    idx = {c: i for i, c in enumerate(cols)}
+    for raw in f:
+        line = raw.decode("utf-8", errors="replace").rstrip("\n\r")
+        if not line:
+            continue
+        parts = line.split("\t")
+        if len(parts) < len(cols):
+            continue
+        reg_num = parts[idx["reg_num"]].strip()
+        app_num = parts[idx["app_num"]].strip()
+        conti = legacy_to_date(parts[idx["conti_prd_expire_ymd"]])
+        next_pen = legacy_to_date(parts[idx["next_pen_pymnt_tm_lmt_ymd"]])
+        app_dt = legacy_to_date(parts[idx["app_year_month_day"]])
+        pub_num = parts[idx["app_exam_pub_num"]].strip()
+        pub_dt = legacy_to_date(parts[idx["app_exam_pub_year_month_day"]])
+        set_reg_dt = legacy_to_date(parts[idx["set_reg_year_month_day"]])
+        title = re.sub(r"\s+", " ", (parts[idx["invent_title_etc"]] or "").strip())
+        reason = _is_inactive_reason(conti, next_pen, app_dt, today)
+        if not reason:
+            continue
+        yield JpRow(
+            patent_id=_pick_patent_id(pub_num, reg_num, app_num),
+            title=title or "(no title)",
+            title_en=None,
+            date=_pick_display_date(pub_dt, set_reg_dt, app_dt),
+            inactive_reason=reason,
+        )
+
+
+# --- synthetic data --------------------------------------------------------
+
+def ymd(d: date) -> str:
+    return d.strftime("%Y%m%d")
+
+
+def write_tsv(path: Path, rows: int, ncols: int, inactive: float, today: date, seed: int = 11) -> None:
+    rng = random.Random(seed)
+    filler = [f"col_{i:02d}" for i in range(max(0, ncols - len(MGT_COLUMNS)))]
+    header = list(MGT_COLUMNS[:4]) + filler[: len(filler) // 2] + list(MGT_COLUMNS[4:]) + filler[len(filler) // 2 :]
+    pos = {c: i for i, c in enumerate(header)}
+    future = ymd(today + timedelta(days=400))
+    with open(path, "w", encoding="utf-8-sig", newline="") as out:
+        out.write("\t".join(header) + "\n")
+        for n in range(rows):
+            rec = ["0"] * len(header)
+            app = today - timedelta(days=rng.randint(365, 19 * 365))
+            rec[pos["reg_num"]] = f"{n + 1000000:07d}"
+            rec[pos["app_num"]] = f"{2000000000 + n:010d}"
+            rec[pos["app_year_month_day"]] = ymd(app)
+            rec[pos["app_exam_pub_num"]] = "0000000000" if rng.random() < 0.5 else f"{2010000000 + n:010d}"
+            rec[pos["app_exam_pub_year_month_day"]] = ymd(app + timedelta(days=540))
+            rec[pos["set_reg_year_month_day"]] = ymd(app + timedelta(days=900))
+            rec[pos["next_pen_pymnt_tm_lmt_ymd"]] = future
+            rec[pos["conti_prd_expire_ymd"]] = ymd(app + timedelta(days=20 * 365))
+            rec[pos["invent_title_etc"]] = rng.choice(TITLES)
+            if rng.random() < inactive:
+                kind = rng.randrange(3)
+                if kind == 0:
+                    rec[pos["next_pen_pymnt_tm_lmt_ymd"]] = ymd(today - timedelta(days=rng.randint(1, 900)))
+                elif kind == 1:
+                    rec[pos["conti_prd_expire_ymd"]] = ymd(today - timedelta(days=rng.randint(1, 900)))
+                else:
+                    rec[pos["app_year_month_day"]] = ymd(today - timedelta(days=20 * 366 + rng.randint(1, 900)))
+                    rec[pos["conti_prd_expire_ymd"]] = "00000000"
+            out.write("\t".join(rec) + "\n")
+
+
+def run(parser, path: Path, today: date):
+    with open(path, "rb") as f:
+        t0 = time.perf_counter()
+        out = list(parser(f, today))
+        return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--cols", type=int, default=40, help="columns per row (default 40)")
+    ap.add_argument("--inactive", type=float, default=0.25, help="share of inactive rows (default 0.25)")
+    args = ap.parse_args()
+
+    today = date(2024, 6, 3)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "upd_mgt_info_p.tsv"
+        write_tsv(path, args.rows, args.cols, args.inactive, today)
+        mb = path.stat().st_size / 1e6
+        print(f"{args.rows:,} rows, {args.cols} columns, {mb:,.0f} MB")
+
+        old, t_old = run(legacy_iter, path, today)
+        new, t_new = run(lambda f, d: _iter_mgt_rows(f, path.name, d), path, today)
+
+    print(f"  legacy     {args.rows / t_old:12,.0f} rows/s  {t_old:6.1f}s  {len(old):,} inactive")
+    print(f"  projected  {args.rows / t_new:12,.0f} rows/s  {t_new:6.1f}s  {len(new):,} inactive")
+    print(f"  speedup {t_old / t_new:.1f}x, outputs {'match' if old == new else 'DIFFER'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+bench_row_mapping.py
+
+CPU time and peak allocation per /search response at per_page=100, from
+the DB fetch up to the serialized JSON body. The two paths compared:
+
+  orm      select(PatentIndex) through a Session, an InactivePatent copy per
+           row, PatentHit / SearchResponse models, JSONResponse (the old path)
+  rows     column-only Core select into db_layer.PatentRow, server._orjson
+
+Rows are read from an in-memory SQLite copy of patents_index, so no
+Postgres is needed and both paths pay the same driver cost.
+
+Usage:
+    python tools/bench_row_mapping.py
+    python tools/bench_row_mapping.py --per-page 100 --requests 2000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "Backend"))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from sqlalchemy import create_engine, select, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import db_layer as db  # noqa: E402
+from server import PatentHit, SearchResponse, _orjson  # noqa: E402
+
+
+def make_engine(n: int):
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE patents_index (
+                jurisdiction TEXT, patent_id TEXT, title TEXT, title_en TEXT,
+                date DATE, inactive_reason TEXT, PRIMARY KEY (jurisdiction, patent_id)
+            )
+        """))
+        conn.execute(
+            text("INSERT INTO patents_index VALUES ('US', :p, :t, NULL, :d, NULL)"),
+            [
+                {"p": f"{i:08d}", "t": f"Rotary engine apparatus number {i}", "d": date(1990, 1, 1) + timedelta(days=i)}
+                for i in range(n)
+            ],
+        )
+    return eng
+
+
+def orm_path(eng, per_page: int) -> bytes:
+    stmt = select(db.PatentIndex).order_by(db.PatentIndex.patent_id).limit(per_page)
+    with Session(eng) as s:
+        out = []
+        for r in s.execute(stmt).scalars():
+            fake = db.InactivePatent()
+            fake.patent = r.patent_id
+            fake.title = r.title or ""
+            fake.title_en = r.title_en
+            fake.grant_date = r.date
+            out.append(fake)
+    resp = SearchResponse(
+        q="rotary",
+        page=1,
+        per_page=per_page,
+        total=per_page,
+        results=[
+            PatentHit(patent=r.patent, title=r.title, title_en=r.title_en, grant_date=r.grant_date) for r in out
+        ],
+    )
+    # FastAPI re-validates the returned model against response_model, then encodes
+    content = SearchResponse.model_validate(resp.model_dump()).model_dump(mode="json")
+    return JSONResponse(content).body
+
+
+def rows_path(eng, per_page: int) -> bytes:
+    stmt = select(*db._ROW_COLUMNS).order_by(db.PatentIndex.patent_id).limit(per_page)
+    with Session(eng) as s:
+        out = [
+            db.PatentRow(pid, title or "", title_en, d)
+            for pid, title, title_en, d in s.connection().execute(stmt).all()
+        ]
+    return _orjson({
+        "q": "rotary",
+        "page": 1,
+        "per_page": per_page,
+        "total": per_page,
+        "results": out,
+        "next_cursor": None,
+        "total_is_lower_bound": False,
+        "total_is_estimate": False,
+        "facets": None,
+        "facets_truncated": False,
+    }).body
+
+
+def measure(fn, eng, per_page: int, requests: int):
+    fn(eng, per_page)
+    t0 = time.process_time()
+    for _ in range(requests):
+        fn(eng, per_page)
+    cpu_us = (time.process_time() - t0) / requests * 1e6
+
+    tracemalloc.start()
+    fn(eng, per_page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_us, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--per-page", type=int, default=100)
+    ap.add_argument("--requests", type=int, default=1000)
+    args = ap.parse_args()
+
+    eng = make_engine(args.per_page)
+    print(f"per_page={args.per_page}, {args.requests:,} requests per path")
+    results = {}
+    for label, fn in (("orm", orm_path), ("rows", rows_path)):
+        cpu_us, peak = measure(fn, eng, args.per_page, args.requests)
+        results[label] = cpu_us
+        print(f"  {label:<5} {cpu_us:9.1f} us cpu/request  peak {peak / 1024:7.1f} KiB")
+    print(f"  speedup {results['orm'] / results['rows']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+bench_search_compile.py
+
+Python-side overhead per /search request, before and after the cached
+statement shapes in db_layer: building the count and page statements,
+SQLAlchemy's compiled-cache lookup and parameter processing. No database
+is needed; the work measured is what runs before psycopg sends the query.
+
+"legacy" rebuilds the expression tree for every request the way
+search_patents used to (literal ILIKE patterns, to_date() year bounds, a
+fresh ORDER BY list). "shapes" looks the statements up with
+db_layer._page_statement / _count_statement and binds a params dict.
+
+Usage:
+    python tools/bench_search_compile.py
+    python tools/bench_search_compile.py --requests 20000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "Backend"))
+
+from sqlalchemy import and_, func, select, text  # noqa: E402
+
+import db_layer as db  # noqa: E402
+from db_layer import PatentIndex  # noqa: E402
+
+WORDS = ["rotary", "engine", "optical", "fiber", "battery", "electrode", "valve", "sensor", "polymer"]
+
+
+def legacy_condition(tokens, jurisdiction, year_from, year_to):
+    cond = and_(*[PatentIndex.search_text.ilike(f"%{t}%") for t in tokens]) if tokens else text("TRUE")
+    if jurisdiction != "ALL":
+        cond = cond & (PatentIndex.jurisdiction == jurisdiction)
+    if year_from:
+        cond = cond & (PatentIndex.date >= func.to_date(f"{year_from}-01-01", "YYYY-MM-DD"))
+    if year_to:
+        cond = cond & (PatentIndex.date <= func.to_date(f"{year_to}-12-31", "YYYY-MM-DD"))
+    return cond
+
+
+def legacy_statements(req):
+    tokens, jurisdiction, year_from, year_to, sort_by, page = req
+    cond = legacy_condition(tokens, jurisdiction, year_from, year_to)
+    count = select(func.count()).select_from(PatentIndex).where(cond)
+    page_stmt = (
+        select(PatentIndex, db._TITLE_KEY.label("k_title"))
+        .where(cond)
+        .order_by(*db._order_by(sort_by, "desc"))
+        .limit(21)
+        .offset((page - 1) * 20)
+    )
+    return [(count, None), (page_stmt, None)]
+
+
+def shape_statements(req):
+    tokens, jurisdiction, year_from, year_to, sort_by, page = req
+    shape = db._query_shape(tokens, jurisdiction, year_from, year_to)
+    params = db._query_params(tokens, jurisdiction, year_from, year_to)
+    page_params = dict(params, limit=21, offset=(page - 1) * 20)
+    return [
+        (db._count_statement(shape, False), params),
+        (db._page_statement(shape, sort_by, "desc", False, None), page_params),
+    ]
+
+
+def compile_like_execute(stmt, params, dialect, cache):
+    """The part of Connection.execute that runs before the DBAPI call."""
+    compiled, extracted, _, _ = stmt._compile_w_cache(dialect, compiled_cache=cache, column_keys=[])
+    return compiled.construct_params(params, extracted_parameters=extracted)
+
+
+def make_requests(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        tokens = rng.sample(WORDS, rng.randint(1, 3))
+        y = rng.choice([None, rng.randint(1976, 2005)])
+        out.append((
+            tokens,
+            rng.choice(["US", "US", "JP", "ALL"]),
+            y,
+            y + 5 if y and rng.random() < 0.5 else None,
+            rng.choice(["date", "title"]),
+            rng.randint(1, 10),
+        ))
+    return out
+
+
+def bench(build, reqs, repeat: int) -> float:
+    dialect = db.engine.dialect
+    best = float("inf")
+    for _ in range(repeat):
+        cache: dict = {}
+        t0 = time.perf_counter()
+        for req in reqs:
+            for stmt, params in build(req):
+                compile_like_execute(stmt, params, dialect, cache)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(reqs) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=5000, help="synthetic requests per run (default 5000)")
+    ap.add_argument("--repeat", type=int, default=3, help="timing repetitions, best is reported (default 3)")
+    args = ap.parse_args()
+
+    reqs = make_requests(args.requests)
+    shape_statements(reqs[0])  # warm the lru caches once; steady state is what matters
+    old = bench(legacy_statements, reqs, args.repeat)
+    new = bench(shape_statements, reqs, args.repeat)
+    print(f"{args.requests:,} requests (count + page statement each)")
+    print(f"  legacy  {old:8.1f} us/request")
+    print(f"  shapes  {new:8.1f} us/request  ({old / new:.1f}x)")
+    print(f"  page shapes cached: {db._page_statement.cache_info().currsize}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+bench_search_modes.py
+
+Latency benchmark for /search modes: substring (trigram ILIKE) vs fts
+(tsvector + ts_rank_cd), calling db_layer.search_patents directly.
+
+Synthetic rows are written to patents_index under the jurisdiction 'ZZ', in
+a scratch database that --database-url must name: seeded into the live
+index they would show up in jurisdiction=ALL search, /export, facets and
+/stats. The tool refuses the DATABASE_URL the API is configured with.
+--cleanup removes the rows again.
+
+Usage:
+    createdb patents_bench
+    python tools/bench_search_modes.py --database-url postgresql+psycopg://localhost/patents_bench --seed 3000000
+    python tools/bench_search_modes.py --database-url postgresql+psycopg://localhost/patents_bench --repeat 20
+    python tools/bench_search_modes.py --database-url postgresql+psycopg://localhost/patents_bench --cleanup
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "Backend"))
+
+from dotenv import load_dotenv  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+db = None  # db_layer, imported by main() once DATABASE_URL points at the scratch database
+
+BENCH_JURISDICTION = "ZZ"
+
+WORDS = [
+    "method", "apparatus", "system", "device", "rotary", "engine", "valve", "assembly",
+    "semiconductor", "circuit", "optical", "fiber", "composition", "polymer", "battery",
+    "electrode", "wireless", "signal", "processing", "image", "sensor", "vehicle",
+    "brake", "control", "fluid", "pump", "medical", "catheter", "antenna", "display",
+]
+
+QUERIES = ["method", "rotary engine", "optical fiber sensor", "battery electrode polymer", "wireless signal"]
+
+
+def seed(n: int, batch: int) -> None:
+    db.init_db()
+    words = "ARRAY[" + ", ".join(f"'{w}'" for w in WORDS) + "]"
+    pick = f"({words})[1 + floor(random() * {len(WORDS)})::int]"
+    with db.engine.begin() as conn:
+        start = conn.execute(text(
+            "SELECT count(*) FROM patents_index WHERE jurisdiction = :j"
+        ), {"j": BENCH_JURISDICTION}).scalar_one()
+    done = 0
+    while done < n:
+        k = min(batch, n - done)
+        with db.engine.begin() as conn:
+            conn.execute(text(f"""
+                INSERT INTO patents_index (jurisdiction, patent_id, title, date)
+                SELECT :j, 'ZZ' || g,
+                       initcap({pick} || ' ' || {pick} || ' ' || {pick} || ' ' || {pick}),
+                       DATE '1976-01-01' + floor(random() * 18000)::int
+                FROM generate_series(:lo, :hi) g
+                ON CONFLICT DO NOTHING
+            """), {"j": BENCH_JURISDICTION, "lo": start + done + 1, "hi": start + done + k})
+        done += k
+        print(f"  seeded {done:,}/{n:,}", flush=True)
+    with db.engine.begin() as conn:
+        conn.execute(text("ANALYZE patents_index"))
+
+
+def cleanup() -> None:
+    with db.engine.begin() as conn:
+        n = conn.execute(text("DELETE FROM patents_index WHERE jurisdiction = :j"), {"j": BENCH_JURISDICTION}).rowcount
+    print(f"removed {n:,} synthetic rows")
+
+
+def measure(q: str, mode: str, sort_by: str, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        db.search_patents(q=q, per_page=20, sort_by=sort_by, jurisdiction=BENCH_JURISDICTION, mode=mode)
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seed", type=int, default=0, help="insert this many synthetic rows first")
+    ap.add_argument("--seed-batch", type=int, default=500_000)
+    ap.add_argument("--repeat", type=int, default=10, help="runs per query and mode (default 10)")
+    ap.add_argument("--cleanup", action="store_true", help="delete the synthetic rows and exit")
+    ap.add_argument("--database-url", required=True,
+                    help="scratch database to seed and search (not the one the API serves)")
+    args = ap.parse_args()
+
+    for env in (ROOT / "Backend" / ".env", ROOT / ".env"):
+        if env.exists():
+            load_dotenv(env, override=False)
+    if args.database_url == os.getenv("DATABASE_URL"):
+        raise SystemExit("--database-url is the configured DATABASE_URL; use a scratch database")
+    # db_layer builds its engine from DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    global db
+    import db_layer as db
+
+    if args.cleanup:
+        cleanup()
+        return
+    if args.seed:
+        seed(args.seed, args.seed_batch)
+
+    print(f"{'query':<28} {'mode':<10} {'sort':<10} {'p50 ms':>9} {'p95 ms':>9}")
+    for q in QUERIES:
+        for mode, sort_by in (("substring", "date"), ("fts", "date"), ("fts", "relevance")):
+            times = sorted(measure(q, mode, sort_by, args.repeat))
+            p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+            print(f"{q:<28} {mode:<10} {sort_by:<10} {statistics.median(times):>9.1f} {p95:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
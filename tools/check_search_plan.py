@@ -0,0 +1,53 @@
+"""
+check_search_plan.py
+
+EXPLAIN check for the /search token predicate: runs EXPLAIN on the same
+WHERE clause db_layer.search_patents builds for a typical query and fails
+unless Postgres plans a Bitmap Index Scan on the search_text trigram index.
+
+Usage:
+    python tools/check_search_plan.py
+    python tools/check_search_plan.py --q "rotary engine" --jurisdiction ALL
+    python tools/check_search_plan.py --no-seqscan   # on a small/dev table
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "Backend"))
+
+from sqlalchemy import func, select, text  # noqa: E402
+
+import db_layer as db  # noqa: E402
+
+INDEX = "patents_index_search_trgm"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--q", default="rotary engine", help="query to plan (default: two tokens)")
+    ap.add_argument("--jurisdiction", default="US", choices=["US", "JP", "ALL"])
+    ap.add_argument("--no-seqscan", action="store_true",
+                    help="SET enable_seqscan = off, to prove the index is usable on a tiny table")
+    args = ap.parse_args()
+
+    cond = db._search_condition(db._tokens(args.q), args.jurisdiction, None, None)
+    stmt = select(func.count()).select_from(db.PatentIndex).where(cond)
+    compiled = stmt.compile(db.engine)
+
+    with db.engine.begin() as conn:
+        if args.no_seqscan:
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = "\n".join(conn.exec_driver_sql("EXPLAIN " + str(compiled), compiled.params).scalars())
+
+    print(plan)
+    if f"Bitmap Index Scan on {INDEX}" not in plan:
+        raise SystemExit(f"FAIL: expected a Bitmap Index Scan on {INDEX}")
+    print(f"OK: token predicate uses {INDEX}")
+
+
+if __name__ == "__main__":
+    main()
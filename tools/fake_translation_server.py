@@ -0,0 +1,126 @@
+"""
+fake_translation_server.py
+
+Local stand-in for a LibreTranslate-style endpoint, for exercising the
+translation worker without touching a real provider. POST /translate with
+{"q": [...], "source": "ja", "target": "en"} answers
+{"translatedText": ["[en] ...", ...]} after --latency seconds.
+
+It enforces its own token bucket (--rate requests/s) and answers 429 with
+Retry-After when that is exceeded, and fails a random --error-rate share of
+requests with 503, so backoff and retry paths get exercised too.
+GET /stats returns request / title / 429 / 503 counters.
+
+Its answers are cached and written to title_en like real ones, so the
+backfill and jp-translate refuse a local TRANSLATE_URL unless
+--database-url names a scratch database.
+
+Usage:
+    python tools/fake_translation_server.py --port 5005 --latency 0.2 --rate 20
+    TRANSLATE_URL=http://127.0.0.1:5005/translate \\
+        python tools/backfill_jp_translations.py --provider http --concurrency 16 \\
+        --database-url postgresql+psycopg://localhost/patents_scratch
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATS = {"requests": 0, "titles": 0, "throttled": 0, "errors": 0}
+_lock = threading.Lock()
+
+
+class Bucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.burst = max(1.0, rate)  # below 1/s a cap of `rate` would never reach one token
+        self.tokens = self.burst
+        self.last = time.monotonic()
+
+    def take(self) -> bool:
+        with _lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def make_handler(latency: float, error_rate: float, bucket: Bucket | None):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: dict, headers: dict | None = None) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                with _lock:
+                    self._send(200, dict(STATS))
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/translate":
+                self._send(404, {"error": "not found"})
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            q = body.get("q", [])
+            if bucket is not None and not bucket.take():
+                with _lock:
+                    STATS["throttled"] += 1
+                self._send(429, {"error": "too many requests"}, {"Retry-After": "1"})
+                return
+            if random.random() < error_rate:
+                with _lock:
+                    STATS["errors"] += 1
+                self._send(503, {"error": "unavailable"})
+                return
+            time.sleep(latency)
+            titles = q if isinstance(q, list) else [q]
+            with _lock:
+                STATS["requests"] += 1
+                STATS["titles"] += len(titles)
+            out = [f"[en] {t}" for t in titles]
+            self._send(200, {"translatedText": out if isinstance(q, list) else out[0]})
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5005)
+    ap.add_argument("--latency", type=float, default=0.2, help="seconds per request (default 0.2)")
+    ap.add_argument("--rate", type=float, default=0, help="requests/s before answering 429; 0 = unlimited")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="share of requests failed with 503 (default 0)")
+    args = ap.parse_args()
+
+    bucket = Bucket(args.rate) if args.rate > 0 else None
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.latency, args.error_rate, bucket))
+    print(f"fake translator on http://{args.host}:{args.port}/translate (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(STATS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+load_test_search.py
+
+Closed-loop load test for the API's /search endpoint: N client threads
+each send requests back to back for a fixed time. Reports throughput,
+latency percentiles and errors for every concurrency level.
+
+To compare the sync and async database paths, run the server once per
+setting and point this script at it:
+
+    ASYNC_DB=0 uvicorn server:app --workers 1 --port 8000   # from Backend/
+    python tools/load_test_search.py --label sync
+
+    ASYNC_DB=1 uvicorn server:app --workers 1 --port 8000
+    python tools/load_test_search.py --label async
+
+By default every request gets a random page/year window, so most requests
+miss the in-process result cache and reach the database. Pass --cached to
+measure the cache-hit path instead.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import threading
+import time
+
+import requests
+
+QUERIES = ["engine", "rotary engine", "optical fiber", "battery", "semiconductor device", "valve", "sensor"]
+
+
+def make_params(rng: random.Random, cached: bool) -> dict:
+    q = rng.choice(QUERIES)
+    if cached:
+        return {"q": q}
+    y = rng.randint(1976, 2005)
+    return {"q": q, "page": rng.randint(1, 20), "year_from": y, "year_to": y + rng.randint(0, 10)}
+
+
+def client(url: str, stop_at: float, cached: bool, seed: int, latencies: list, errors: list, lock) -> None:
+    rng = random.Random(seed)
+    session = requests.Session()
+    mine, failed = [], 0
+    while time.perf_counter() < stop_at:
+        t0 = time.perf_counter()
+        try:
+            r = session.get(url, params=make_params(rng, cached), timeout=30)
+            ok = r.status_code == 200
+        except requests.RequestException:
+            ok = False
+        if ok:
+            mine.append(time.perf_counter() - t0)
+        else:
+            failed += 1
+    with lock:
+        latencies.extend(mine)
+        errors.append(failed)
+
+
+def run_level(url: str, clients: int, seconds: float, cached: bool) -> dict:
+    latencies: list = []
+    errors: list = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=client, args=(url, stop_at, cached, n, latencies, errors, lock), daemon=True)
+        for n in range(clients)
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        if not latencies:
+            return float("nan")
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "clients": clients,
+        "ok": len(latencies),
+        "errors": sum(errors),
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8000/search")
+    ap.add_argument("--clients", default="50,200,500", help="comma-separated concurrency levels (default 50,200,500)")
+    ap.add_argument("--seconds", type=float, default=20, help="duration of each level (default 20)")
+    ap.add_argument("--cached", action="store_true", help="repeat a few identical queries so the result cache answers")
+    ap.add_argument("--label", default="", help="tag printed on each line, e.g. sync / async")
+    args = ap.parse_args()
+
+    print(f"{'label':<8} {'clients':>7} {'ok':>8} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for n in (int(c) for c in args.clients.split(",") if c.strip()):
+        r = run_level(args.url, n, args.seconds, args.cached)
+        print(
+            f"{args.label:<8} {r['clients']:>7} {r['ok']:>8,} {r['errors']:>7,} {r['rps']:>9,.1f}"
+            f" {r['p50']:>9.1f} {r['p95']:>9.1f} {r['p99']:>9.1f}",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()